@@ -7,16 +7,18 @@ import time
 import difflib
 import argparse
 import re
+import concurrent.futures
 
 parser = argparse.ArgumentParser()
 parser.add_argument('testdir_or_test', nargs='*',
         help='subdir name or test script name')
 parser.add_argument('-u', '--update', action='store_true',
         help='Update test expecations instead of verifying them')
+parser.add_argument('-j', '--jobs', type=int, default=1,
+        help='Number of test scripts to run concurrently (default: 1)')
 args = parser.parse_args()
 
 def run_test(path):
-    print(path)
     p = subprocess.Popen(path, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     o,e = p.communicate()
     while True:
@@ -98,26 +100,32 @@ for test in sorted(tests):
 
     ran.append(test)
 
-    success = True
+# Each test script runs in its own subprocess and work dir, so they can be run
+# concurrently. Results are still verified and reported in sorted order.
+with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+    results = executor.map(run_test, ran)
 
-    name, ext = os.path.splitext(test)
-    ok_file = name + '.ok'
-    err_file = name + '.err'
+    for test, (rc, out, err) in zip(ran, results):
+        print(test)
 
-    rc, out, err = run_test(test)
+        success = True
 
-    if rc != 0:
-        sys.stderr.write('%r: returned %d\n' % (os.path.basename(test), rc))
-        success = False
+        name, ext = os.path.splitext(test)
+        ok_file = name + '.ok'
+        err_file = name + '.err'
 
-    if not verify_output(out, ok_file, args.update):
-        success = False
-    if not verify_output(err, err_file, args.update):
-        success = False
+        if rc != 0:
+            sys.stderr.write('%r: returned %d\n' % (os.path.basename(test), rc))
+            success = False
 
-    if not success:
-        sys.stderr.write('\nTest failed: %r\n\n' % os.path.basename(test))
-        errors.append(test)
+        if not verify_output(out, ok_file, args.update):
+            success = False
+        if not verify_output(err, err_file, args.update):
+            success = False
+
+        if not success:
+            sys.stderr.write('\nTest failed: %r\n\n' % os.path.basename(test))
+            errors.append(test)
 
 if errors:
     print('%d of %d TESTS FAILED:\n  %s' % (len(errors), len(ran), '\n  '.join(errors)))
@@ -34,6 +34,17 @@ print('stderr:')
 print(p.get_stderr())
 print('done.')
 
+print('- output is read in complete lines, the last one once the process exits')
+p = process.Process('partial', tmpdir.new_dir('partial'), ('/bin/sh', '-c', 'printf "complete\\npartial"; read x'))
+p.launch()
+time.sleep(.5)
+out, mark = p.read_output_since('stdout')
+print(repr(out.splitlines()[1:]))
+p.process_obj.stdin.close()
+p.wait()
+out, mark = p.read_output_since('stdout', mark)
+print(repr(out))
+
 test_ssh = True
 test_ssh = False
 if test_ssh:
@@ -0,0 +1 @@
+../_prep.py
\ No newline at end of file
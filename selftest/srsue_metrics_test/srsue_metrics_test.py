@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import _prep
+
+import os
+import tempfile
+from osmo_gsm_tester.core import log
+from osmo_gsm_tester.obj.ms_srs import srsUEMetrics
+
+# the logged numpy result repr differs between numpy versions
+log.set_all_levels(log.L_LOG)
+
+# two component carriers, one row per carrier and time slot
+METRICS_CSV = '''time;cc;earfcn;dl_brate;ul_brate
+0;0;3400;0;0
+0;1;3450;0;0
+1;0;3400;1000000;500000
+1;1;3450;3000000;500000
+2;0;3400;2000000;1000000
+2;1;3450;4000000;1000000
+'''
+
+def verify(metrics, *args, **kwargs):
+    try:
+        print(metrics.verify(*args, **kwargs))
+    except log.Error as e:
+        print('failed: %s' % e)
+
+with tempfile.TemporaryDirectory() as tmpdir:
+    metrics_file = os.path.join(tmpdir, 'srsue_metrics.csv')
+    with open(metrics_file, 'w') as f:
+        f.write(METRICS_CSV)
+    metrics = srsUEMetrics(metrics_file)
+
+    print('- averages over all component carriers')
+    verify(metrics, 3e6, 'avg', 'dl_brate', 'gt')
+    verify(metrics, 1e6, 'sum', 'ul_brate', 'eq')
+    verify(metrics, 2e6, 'avg', 'dl_brate+ul_brate', 'lt')
+
+    print('- rolling averages')
+    verify(metrics, 4e6, 'max_rolling_avg', 'dl_brate', 'gt', window=2)
+    verify(metrics, 4e6, 'min_rolling_avg', 'dl_brate', 'gt', window=1)
+
+    print('- window longer than the data is clamped')
+    print(srsUEMetrics.rolling_avg([1.0, 2.0, 3.0], 2))
+    print(srsUEMetrics.rolling_avg([1.0, 2.0, 3.0], 10))
+    verify(metrics, 4e6, 'max_rolling_avg', 'dl_brate', 'gt', window=10)
+    verify(metrics, 4e6, 'min_rolling_avg', 'dl_brate', 'lt', window=10)
+
+    print('- column names match for both CSV loaders')
+    for name, row in (('numeric.csv', '0;0;1.5;20'), ('mixed.csv', '0;0;n/a;20')):
+        csv_file = os.path.join(tmpdir, name)
+        with open(csv_file, 'w') as f:
+            f.write('time;cc;dl bler(%);ul.snr\n' + row + '\n')
+        print(srsUEMetrics(csv_file).raw_data.dtype.names)
+
+    print('- no samples')
+    try:
+        srsUEMetrics.rolling_avg([], 5)
+    except log.Error as e:
+        print('failed: %s' % e)
+
+# vim: expandtab tabstop=4 shiftwidth=4
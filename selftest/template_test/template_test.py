@@ -4,6 +4,7 @@ import _prep
 
 import sys
 import os
+import io
 
 from osmo_gsm_tester.core import template, log
 
@@ -100,5 +101,12 @@ print('- Testing: template directory overlay (present in both dirs)')
 print(template.render('osmo-bsc.cfg', dict(foo=dict(bar=dict(works='yes')))))
 print('- Testing: template directory overlay (present only on overlay dir)')
 print(template.render('mytemplate.cfg', dict(one=dict(two=dict(works='yes')))))
+print('- Testing: template rendered straight to a file')
+buf = io.StringIO()
+template.render_to_file('mytemplate.cfg', dict(one=dict(two=dict(works='yes'))), buf)
+print(buf.getvalue() == template.render('mytemplate.cfg', dict(one=dict(two=dict(works='yes')))))
+print('- Testing: inline template rendered twice with different values')
+print(template.render_strbuf_inline('inline ${param1}', dict(param1='first')))
+print(template.render_strbuf_inline('inline ${param1}', dict(param1='second')))
 
 # vim: expandtab tabstop=4 shiftwidth=4
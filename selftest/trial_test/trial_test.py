@@ -60,5 +60,7 @@ inst = util.Dir( t.get_inst('sample'))
 print('inst: ' + str(inst))
 with open(inst.child('file1'), 'r') as f:
     print('content file1: %s' % f.read())
+print('- Same inst dir is returned on repeated lookup')
+print(t.get_inst('sample') == str(inst), t.get_inst('sample', 'foobar') != str(inst))
 
 # vim: expandtab tabstop=4 shiftwidth=4
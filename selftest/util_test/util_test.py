@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 import _prep
 
-from osmo_gsm_tester.core.util import hash_obj
+import os
+import tempfile
+from osmo_gsm_tester.core.util import hash_obj, Dir, touch_file, dir_fingerprint, file_state, marker_matches, write_marker, MARKER_SUFFIX
 
 print('- expect the same hashes on every test run')
 print(hash_obj('abc'))
@@ -9,3 +11,46 @@ print(hash_obj(1))
 print(hash_obj([1, 2, 3]))
 print(hash_obj({ 'k': [ {'a': 1, 'b': 2}, {'a': 3, 'b': 4}, ],
                  'i': [ {'c': 1, 'd': 2}, {'c': 3, 'd': 4}, ] }))
+
+print('- scan directory entries')
+with tempfile.TemporaryDirectory() as tmpdir:
+    d = Dir(tmpdir)
+    d.mkdir('lib')
+    touch_file(d.mk_parentdir('bin', 'prog'))
+    entries = d.scan()
+    print(sorted(entries.keys()), entries['lib'].is_dir(), entries['lib'].is_file())
+    entries = d.scan('bin')
+    print(sorted(entries.keys()), entries['prog'].is_file())
+    print(d.scan('nonexistent'), d.scan('bin', 'prog'))
+
+print('- directory fingerprint changes with its contents')
+with tempfile.TemporaryDirectory() as tmpdir:
+    d = Dir(tmpdir)
+    touch_file(d.mk_parentdir('bin', 'prog'))
+    fp1 = dir_fingerprint(tmpdir)
+    print(fp1 == dir_fingerprint(tmpdir))
+    with open(d.child('bin', 'prog'), 'w') as f:
+        f.write('changed')
+    fp2 = dir_fingerprint(tmpdir)
+    print(fp2 != fp1)
+    touch_file(d.child('lib'))
+    print(dir_fingerprint(tmpdir) not in (fp1, fp2))
+    fp_bin = dir_fingerprint(tmpdir, 'bin')
+    touch_file(d.child('other'))
+    print(fp_bin == dir_fingerprint(tmpdir, 'bin'), fp_bin != dir_fingerprint(tmpdir, 'bin', 'lib'))
+    fp = dir_fingerprint(tmpdir)
+    touch_file(d.child('bin', '.prog' + MARKER_SUFFIX))
+    print(fp == dir_fingerprint(tmpdir))
+
+print('- marker tells whether a file changed')
+with tempfile.TemporaryDirectory() as tmpdir:
+    d = Dir(tmpdir)
+    touch_file(d.child('prog'))
+    marker = d.child('.prog' + MARKER_SUFFIX)
+    print(marker_matches(marker, file_state(d.child('prog'), 'rpath')))
+    write_marker(marker, file_state(d.child('prog'), 'rpath'))
+    print(marker_matches(marker, file_state(d.child('prog'), 'rpath')))
+    print(marker_matches(marker, file_state(d.child('prog'), 'other-rpath')))
+    with open(d.child('prog'), 'w') as f:
+        f.write('changed')
+    print(marker_matches(marker, file_state(d.child('prog'), 'rpath')))
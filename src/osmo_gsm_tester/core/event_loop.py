@@ -66,6 +66,10 @@ class EventLoop:
             self.defer(user_data)
             return True #to retrigger the timeout
 
+    def _trigger_fd_cb_func(self, fd, condition, user_data):
+            self.defer(user_data)
+            return True #to keep watching the fd
+
     def defer(self, handler, *args, **kwargs):
         self.deferred_handling.defer(handler, *args, **kwargs)
 
@@ -85,27 +89,34 @@ class EventLoop:
         self.gctx.iteration(may_block)
         self.deferred_handling.handle_queue()
 
-    def wait_no_raise(self, condition, condition_args, condition_kwargs, timeout, timestep):
+    def wait_no_raise(self, condition, condition_args, condition_kwargs, timeout, timestep, wakeup_fd=None):
+        '''If wakeup_fd is passed, the condition is also checked as soon as
+           that fd becomes readable, instead of only every timestep.'''
         if not timeout or timeout < 0:
             raise log.Error('wait() *must* time out at some point.', timeout=timeout)
         if timestep < 0.1:
             timestep = 0.1
 
         wait_req = WaitRequest(condition, condition_args, condition_kwargs, timeout, timestep)
-        wait_id = GObject.timeout_add(timestep*1000, self._trigger_cb_func, wait_req.condition_check)
+        wait_ids = [GObject.timeout_add(timestep*1000, self._trigger_cb_func, wait_req.condition_check)]
+        if wakeup_fd is not None:
+            wait_ids.append(GLib.io_add_watch(wakeup_fd, GLib.PRIORITY_DEFAULT, GLib.IO_IN | GLib.IO_HUP,
+                                              self._trigger_fd_cb_func, wait_req.condition_check))
         while True:
             try:
                 self.poll(may_block=True)
             except Exception: # cleanup of temporary resources in the wait scope
-                GObject.source_remove(wait_id)
+                for wait_id in wait_ids:
+                    GObject.source_remove(wait_id)
                 raise
             if wait_req.condition_ack or wait_req.timeout_ack:
-                GObject.source_remove(wait_id)
+                for wait_id in wait_ids:
+                    GObject.source_remove(wait_id)
                 success = wait_req.condition_ack
                 return success
 
-    def wait(self, condition, *condition_args, timeout=300, timestep=1, **condition_kwargs):
-        if not self.wait_no_raise(condition, condition_args, condition_kwargs, timeout, timestep):
+    def wait(self, condition, *condition_args, timeout=300, timestep=1, wakeup_fd=None, **condition_kwargs):
+        if not self.wait_no_raise(condition, condition_args, condition_kwargs, timeout, timestep, wakeup_fd):
             raise log.Error('Wait timeout', condition=condition, timeout=timeout, timestep=timestep)
 
     def sleep(self, seconds):
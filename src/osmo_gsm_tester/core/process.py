@@ -18,9 +18,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import ctypes
+import functools
 import time
 import subprocess
 import signal
+import tempfile
 from abc import ABCMeta, abstractmethod
 from datetime import datetime
 import re
@@ -29,6 +32,38 @@ from . import log
 from .event_loop import MainLoop
 from .util import Dir
 
+# Have all ssh and scp invocations towards the same remote host share a single
+# connection, kept open in background for a while after its last use, instead
+# of doing a new TCP connection and ssh handshake each time:
+SSH_CONTROL_ARGS = ['-o', 'ControlMaster=auto',
+                    '-o', 'ControlPath=' + os.path.join(tempfile.gettempdir(), 'osmo-gsm-tester-ssh-%C'),
+                    '-o', 'ControlPersist=60']
+
+_IN_MODIFY = 0x00000002
+
+def inotify_modify_fd(path):
+    '''Return a non-blocking fd becoming readable whenever the file at path is
+       modified, or None if inotify is not available on the system. Pending
+       events must be consumed with drain_fd() to re-arm it.'''
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(path), _IN_MODIFY) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+def drain_fd(fd):
+    try:
+        while os.read(fd, 4096):
+            pass
+    except BlockingIOError:
+        pass
+
 class TerminationStrategy(log.Origin, metaclass=ABCMeta):
     """A baseclass for terminating a collection of processes."""
 
@@ -139,6 +174,7 @@ class Process(log.Origin):
         self.popen_args = popen_args
         self.popen_kwargs = popen_kwargs
         self.outputs = {}
+        self.stdout_counters = {}
         if not isinstance(self.run_dir, Dir):
             self.run_dir = Dir(os.path.abspath(str(self.run_dir)))
 
@@ -165,12 +201,17 @@ class Process(log.Origin):
         return f
 
     def get_counter_stdout(self, keyword):
-        # Match stdout against keyword
-        n = 0
-        stdout_lines = (self.get_stdout() or '').splitlines()
-        for l in stdout_lines:
+        # Match stdout against keyword. Only output appended since the last
+        # call for the same keyword needs to be looked at:
+        path = self.get_output_file('stdout')
+        counted_path, mark, n = self.stdout_counters.get(keyword, (None, 0, 0))
+        if counted_path != path:
+            mark, n = 0, 0
+        out, mark = self.read_output_since('stdout', mark)
+        for l in out.splitlines():
             if keyword in l:
                 n += 1
+        self.stdout_counters[keyword] = (path, mark, n)
         return n
 
     def launch(self):
@@ -381,6 +422,29 @@ class Process(log.Origin):
         with open(path, 'r') as f:
             return f.seek(0, 2)
 
+    def read_output_since(self, which, since_mark=0):
+        '''Incrementally read process output: return the complete lines appended
+           since since_mark, and the mark to pass on the next call. Lines still
+           being written are left for the next call, unless the process has
+           already terminated.'''
+        out, mark = self.read_output_bytes_since(which, since_mark)
+        return out.decode(errors='replace'), mark
+
+    def read_output_bytes_since(self, which, since_mark=0):
+        '''Same as read_output_since(), but return the raw bytes without
+           decoding them.'''
+        path = self.get_output_file(which)
+        if path is None:
+            return b'', since_mark
+        # Check before reading, so that nothing can be appended afterwards:
+        final = self.terminated()
+        with open(path, 'rb') as f:
+            f.seek(since_mark)
+            out = f.read()
+        if not final:
+            out = out[:out.rfind(b'\n') + 1]
+        return out, since_mark + len(out)
+
     def grep_output(self, which, regex, since_mark=0, line_nrs=False):
         lines = self.get_output(which, since_mark=since_mark).splitlines()
         if not lines:
@@ -415,10 +479,46 @@ class Process(log.Origin):
             self.poll()
         return self.result is not None
 
+    def pidfd_open(self):
+        '''Return a fd becoming readable once the process terminates, or None
+           if not supported by the system.'''
+        try:
+            return os.pidfd_open(self.process_obj.pid)
+        except (AttributeError, OSError):
+            return None
+
     def wait(self, timeout=None):
         if timeout is None:
             timeout = self.default_wait_timeout
-        MainLoop.wait(self.terminated, timeout=timeout)
+        if self.terminated():
+            return
+        # Get woken up right when the process exits instead of on next timestep:
+        pidfd = self.pidfd_open()
+        try:
+            MainLoop.wait(self.terminated, timeout=timeout, wakeup_fd=pidfd)
+        finally:
+            if pidfd is not None:
+                os.close(pidfd)
+
+    def wait_output(self, which, condition, *condition_args, timeout=300, timestep=1, **condition_kwargs):
+        '''Same as MainLoop.wait(), but also check condition right when the
+           output file "which" grows, instead of only every timestep.'''
+        path = self.get_output_file(which)
+        fd = inotify_modify_fd(path) if path is not None else None
+        if fd is None:
+            MainLoop.wait(condition, *condition_args, timeout=timeout, timestep=timestep, **condition_kwargs)
+            return
+
+        @functools.wraps(condition)
+        def drained_condition(*args, **kwargs):
+            drain_fd(fd)
+            return condition(*args, **kwargs)
+
+        try:
+            MainLoop.wait(drained_condition, *condition_args, timeout=timeout, timestep=timestep,
+                          wakeup_fd=fd, **condition_kwargs)
+        finally:
+            os.close(fd)
 
     def stdin_write(self, cmd):
         '''
@@ -454,7 +554,7 @@ class RemoteProcess(Process):
         # We need double -t to force tty and be able to forward signals to
         # processes (SIGHUP) when we close ssh on the local side. As a result,
         # stderr seems to be merged into stdout in ssh client.
-        self.popen_args = ['ssh', '-t', '-t', self.remote_user+'@'+self.remote_host,
+        self.popen_args = ['ssh'] + SSH_CONTROL_ARGS + ['-t', '-t', self.remote_user+'@'+self.remote_host,
                            '%s %s %s' % (cd,
                                          ' '.join(['%s=%r'%(k,v) for k,v in self.remote_env.items()]),
                                          ' '.join(self.popen_args))]
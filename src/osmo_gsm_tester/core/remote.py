@@ -21,12 +21,14 @@ import stat
 import os
 import re
 import pprint
+import shlex
 
 from . import log, util, config, template, process
 
 class RemoteHost(log.Origin):
 
     WRAPPER_SCRIPT = 'ssh_sigkiller.sh'
+    INST_FINGERPRINT_FILE = '.osmo-gsm-tester-inst-fingerprint'
 
     def __init__(self, run_dir, remote_user = 'root', remote_host = 'localhost', remote_cwd=None, remote_port=None):
         super().__init__(log.C_RUN, 'host-' + remote_user + '@' + remote_host)
@@ -143,8 +145,8 @@ class RemoteHost(log.Origin):
         self.run_remote_sync('mk-remote-dir', ('mkdir', '-p', remote_dir_str))
 
     def recreate_remote_dir(self, remote_dir):
-        self.rm_remote_dir(remote_dir)
-        self.create_remote_dir(remote_dir)
+        remote_dir_str = str(remote_dir)
+        self.run_remote_sync('recreate-remote-dir', ('rm', '-rf', remote_dir_str, '&&', 'mkdir', '-p', remote_dir_str))
 
     def inst_compatible_for_remote(self):
         proc = self.run_remote_sync('uname-m', ('uname', '-m'))
@@ -153,44 +155,126 @@ class RemoteHost(log.Origin):
         return False
 
     def scp(self, name, local_path, remote_path):
-        process.run_local_sync(self.run_dir, name, ('scp', '-r', local_path, '%s@%s:%s' % (self.user(), self.host(), remote_path)))
+        process.run_local_sync(self.run_dir, name, ['scp'] + process.SSH_CONTROL_ARGS + ['-r', local_path, '%s@%s:%s' % (self.user(), self.host(), remote_path)])
 
     def scpfrom(self, name, remote_path, local_path):
-        process.run_local_sync(self.run_dir, name, ('scp', '-r', '%s@%s:%s' % (self.user(), self.host(), remote_path), local_path))
+        process.run_local_sync(self.run_dir, name, ['scp'] + process.SSH_CONTROL_ARGS + ['-r', '%s@%s:%s' % (self.user(), self.host(), remote_path), local_path])
+
+    def ssh_cmd_str(self, remote_cmd):
+        'Return a local shell command string running remote_cmd over ssh'
+        args = ['ssh'] + process.SSH_CONTROL_ARGS
+        if self.get_remote_port():
+            args += ['-p', str(self.get_remote_port())]
+        args += ['%s@%s' % (self.user(), self.host()), remote_cmd]
+        return ' '.join([shlex.quote(str(arg)) for arg in args])
+
+    def run_local_pipe_sync(self, name, cmd_str):
+        'Run a local shell pipeline, failing if any of its commands fail'
+        process.run_local_sync(self.run_dir, name, ('/bin/bash', '-c', 'set -o pipefail; ' + cmd_str))
+
+    def scp_bundle(self, name, local_dir, names, remote_dir):
+        '''
+        Copy entries "names" (relative to local_dir) into remote_dir using a
+        single gzip compressed tar stream over one ssh connection, instead of
+        one scp each.
+        '''
+        tar_create = ' '.join([shlex.quote(str(arg)) for arg in ('tar', '-C', local_dir, '-czf', '-') + tuple(names)])
+        tar_extract = 'tar -C %s -xzf -' % shlex.quote(str(remote_dir))
+        self.run_local_pipe_sync(name, '%s | %s' % (tar_create, self.ssh_cmd_str(tar_extract)))
+
+    def scpfrom_bundle(self, name, remote_dir, names, local_dir):
+        '''
+        Copy entries "names" (relative to remote_dir) into local_dir using a
+        single gzip compressed tar stream over one ssh connection. Entries
+        missing on the remote side are skipped instead of failing the whole
+        transfer.
+        '''
+        tar_create = ' '.join([shlex.quote(str(arg)) for arg in ('tar', '-C', remote_dir, '--ignore-failed-read', '-czf', '-') + tuple(names)])
+        tar_extract = 'tar -C %s -xzf -' % shlex.quote(str(local_dir))
+        self.run_local_pipe_sync(name, '%s | %s' % (self.ssh_cmd_str(tar_create), tar_extract))
+
+    def sync_inst_dir(self, local_inst, remote_prefix_dir, names=()):
+        '''
+        Copy local_inst dir into remote_prefix_dir. The copy is skipped if the
+        remote one was uploaded earlier (e.g. by a previous test of the same
+        trial) from a local_inst with the same util.dir_fingerprint().
+        If names are given, only those entries (relative to local_inst) are
+        copied.
+        '''
+        inst_name = os.path.basename(str(local_inst))
+        remote_inst = util.Dir(os.path.join(str(remote_prefix_dir), inst_name))
+        remote_fingerprint_file = remote_inst.child(RemoteHost.INST_FINGERPRINT_FILE)
+        fingerprint = util.dir_fingerprint(str(local_inst), *names)
+        proc = self.run_remote_sync('get-inst-fingerprint', ('cat', remote_fingerprint_file, '2>/dev/null', '||', 'true'))
+        if fingerprint in (proc.get_stdout() or ''):
+            self.dbg('Remote inst dir is up to date, skipping upload', remote_inst=remote_inst)
+            return
+        self.recreate_remote_dir(remote_inst)
+        entries = [os.path.join(inst_name, name) for name in names] if names else [inst_name]
+        self.scp_bundle('scp-inst-to-remote', os.path.dirname(str(local_inst)), entries, remote_prefix_dir)
+        self.run_remote_sync('set-inst-fingerprint', ('echo', fingerprint, '>', remote_fingerprint_file))
 
     def setcap_net_admin(self, binary_path):
         '''
         This functionality requires specific setup on the host running
         osmo-gsm-tester. See osmo-gsm-tester manual for more information.
+        binary_path can also be a list of binaries to set the capability on in
+        one go.
         '''
+        self.run_remote_sync('setcap-netadm', self.setcap_net_admin_args(binary_path))
+
+    def setcap_net_admin_args(self, binary_path):
         SETCAP_NET_ADMIN_BIN = 'osmo-gsm-tester_setcap_net_admin.sh'
-        self.run_remote_sync('setcap-netadm', ('sudo', SETCAP_NET_ADMIN_BIN, binary_path))
+        binary_paths = tuple(binary_path) if util.is_list(binary_path) else (binary_path,)
+        return ('sudo', SETCAP_NET_ADMIN_BIN) + binary_paths
+
+    def setcap_netsys_admin_args(self, binary_path):
+        SETCAP_NETSYS_ADMIN_BIN = 'osmo-gsm-tester_setcap_netsys_admin.sh'
+        return ('sudo', SETCAP_NETSYS_ADMIN_BIN, binary_path)
 
     def setcap_netsys_admin(self, binary_path):
         '''
         This functionality requires specific setup on the host running
         osmo-gsm-tester. See osmo-gsm-tester manual for more information.
         '''
-        SETCAP_NETSYS_ADMIN_BIN = 'osmo-gsm-tester_setcap_netsys_admin.sh'
-        self.run_remote_sync('setcap-netsysadm', ('sudo', SETCAP_NETSYS_ADMIN_BIN, binary_path))
+        self.run_remote_sync('setcap-netsysadm', self.setcap_netsys_admin_args(binary_path))
 
     def create_netns(self, netns):
         '''
         It creates the netns if it doesn't already exist.
         '''
         NETNS_SETUP_BIN = 'osmo-gsm-tester_netns_setup.sh'
-        self.run_remote_sync('create_netns', ('sudo', NETNS_SETUP_BIN, netns))
+        self.run_remote_sync('create_netns', ('test', '-f', os.path.join('/var/run/netns', netns), '||',
+                                              'sudo', NETNS_SETUP_BIN, netns))
+
+    def run_remote_sync_once(self, name, marker_path, token, *popen_args_list):
+        '''
+        Run the commands in popen_args_list one after the other in a single
+        remote call, unless they already succeeded earlier for the same token,
+        as recorded in the remote file marker_path.
+        '''
+        cmds = ' && '.join([' '.join([shlex.quote(str(arg)) for arg in popen_args]) for popen_args in popen_args_list])
+        marker_path = shlex.quote(str(marker_path))
+        token = shlex.quote(token)
+        script = 'test "$(cat %s 2>/dev/null)" = %s || { %s && echo %s > %s; }' % (marker_path, token, cmds, token, marker_path)
+        return self.run_remote_sync(name, ('/bin/sh', '-c', shlex.quote(script)))
 
     def change_elf_rpath(self, binary_path, paths):
         '''
         Change RPATH field in ELF executable binary.
         This feature can be used to tell the loader to load the trial libraries, as
         LD_LIBRARY_PATH is disabled for paths with modified capabilities.
+        binary_path can also be a list of binaries to patch in one go
+        (patchelf >= 0.10).
         '''
+        self.run_remote_sync('patchelf', self.change_elf_rpath_args(binary_path, paths))
+
+    def change_elf_rpath_args(self, binary_path, paths):
         patchelf_bin = self.remote_env.get('PATCHELF_BIN', None)
         if not patchelf_bin:
             patchelf_bin = 'patchelf'
         else:
             self.dbg('Using specific patchelf from %s', patchelf_bin)
 
-        self.run_remote_sync('patchelf', (patchelf_bin, '--set-rpath', paths, binary_path))
+        binary_paths = tuple(binary_path) if util.is_list(binary_path) else (binary_path,)
+        return (patchelf_bin, '--set-rpath', paths) + binary_paths
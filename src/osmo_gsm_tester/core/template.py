@@ -19,7 +19,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import functools
 from mako.lookup import TemplateLookup, Template
+from mako.runtime import Context
 
 from . import log
 from .util import dict2obj
@@ -41,12 +43,12 @@ def set_templates_dir(*templates_dirs):
         if not os.path.isdir(d):
             raise RuntimeError('templates dir is not a dir: %r'
                                % os.path.abspath(d))
-    _lookup = TemplateLookup(directories=templates_dirs)
+    # Templates are not expected to change while the lookup is in use (see
+    # above), so skip checking file modification times on every render:
+    _lookup = TemplateLookup(directories=templates_dirs, filesystem_checks=False)
     _logger = log.Origin(log.C_CNF, 'Templates')
 
-def render(name, values):
-    '''feed values dict into template and return rendered result.
-       ".tmpl" is added to the name to look it up in the templates dir.'''
+def _get_template(name):
     global _lookup
     if _lookup is None:
         set_templates_dir(default_templates_dir())
@@ -54,13 +56,26 @@ def render(name, values):
     log.ctx(tmpl_name)
     template = _lookup.get_template(tmpl_name)
     _logger.dbg('rendering', tmpl_name)
+    return template
+
+def render(name, values):
+    '''feed values dict into template and return rendered result.
+       ".tmpl" is added to the name to look it up in the templates dir.'''
+    return _get_template(name).render(**dict2obj(values))
+
+def render_to_file(name, values, f):
+    '''Same as render(), but write the result straight into file object f
+       instead of building it up as a string first.'''
+    _get_template(name).render_context(Context(f, **dict2obj(values)))
 
-    return template.render(**dict2obj(values))
+@functools.lru_cache(maxsize=64)
+def _compile_inline(strbuf):
+    return Template(strbuf)
 
 def render_strbuf_inline(strbuf, values):
     '''Receive a string containing template syntax, and generate output using
-       passed values.'''
-    mytemplate = Template(strbuf)
+       passed values. Compiled templates are cached by their content.'''
+    mytemplate = _compile_inline(strbuf)
     return mytemplate.render(**dict2obj(values))
 
 # vim: expandtab tabstop=4 shiftwidth=4
@@ -18,6 +18,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import stat
 import sys
 import time
 import fcntl
@@ -27,6 +28,7 @@ import shutil
 import atexit
 import threading
 import importlib.util
+import functools
 import subprocess
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
@@ -51,9 +53,11 @@ def change_elf_rpath(binary, paths, run_dir):
     Change RPATH field in ELF executable binary.
     This feature can be used to tell the loaded to load the trial libraries, as
     LD_LIBRARY_PATH is disabled for paths with modified capabilities.
+    binary can also be a list of binaries to patch in one go (patchelf >= 0.10).
     '''
     from .process import Process
-    proc = Process('patchelf', run_dir, ['patchelf', '--set-rpath', paths, binary])
+    binaries = list(binary) if is_list(binary) else [binary]
+    proc = Process('patchelf', run_dir, ['patchelf', '--set-rpath', paths] + binaries)
     proc.launch_sync()
 
 def ip_to_iface(ip):
@@ -96,10 +100,12 @@ def setcap_net_admin(binary, run_dir):
     '''
     This functionality requires specific setup on the host running
     osmo-gsm-tester. See osmo-gsm-tester manual for more information.
+    binary can also be a list of binaries to set the capability on in one go.
     '''
     from .process import Process
     SETCAP_NET_ADMIN_BIN = 'osmo-gsm-tester_setcap_net_admin.sh'
-    proc = Process(SETCAP_NET_ADMIN_BIN, run_dir, ['sudo', SETCAP_NET_ADMIN_BIN, binary])
+    binaries = list(binary) if is_list(binary) else [binary]
+    proc = Process(SETCAP_NET_ADMIN_BIN, run_dir, ['sudo', SETCAP_NET_ADMIN_BIN] + binaries)
     proc.launch_sync()
 
 def setcap_netsys_admin(binary, run_dir):
@@ -117,6 +123,8 @@ def create_netns(netns, run_dir):
     It creates the netns if it doesn't already exist.
     '''
     from .process import Process
+    if os.path.exists(os.path.join('/var/run/netns', netns)):
+        return
     NETNS_SETUP_BIN = 'osmo-gsm-tester_netns_setup.sh'
     proc = Process('create_netns',run_dir, ['sudo', NETNS_SETUP_BIN, netns])
     proc.launch_sync()
@@ -261,6 +269,16 @@ class Dir():
     def children(self):
         return os.listdir(self.path)
 
+    def scan(self, *rel_path):
+        '''Return dict of name -> os.DirEntry for the entries in the given
+           subdir (empty if it doesn't exist). The entries' is_dir() and
+           is_file() answers are cached, sparing one stat() per check.'''
+        try:
+            with os.scandir(self.child(*rel_path)) as it:
+                return {entry.name: entry for entry in it}
+        except (FileNotFoundError, NotADirectoryError):
+            return {}
+
     def exists(self, *rel_path):
         return os.path.exists(self.child(*rel_path))
 
@@ -387,6 +405,56 @@ def hash_obj(obj, *ignore_keys):
     return acc.hexdigest()
 
 
+# Files named with this suffix record that some preparation step was done on an
+# inst dir. dir_fingerprint() ignores them, so writing one into an inst dir does
+# not make it look modified.
+MARKER_SUFFIX = '-prepared'
+
+def dir_fingerprint(path, *names):
+    '''Return a hash over relative path, size and modification time of all
+       entries below path. It changes whenever files are added, removed or
+       modified, without having to read their content. If names are given,
+       only those entries (relative to path) and everything below them are
+       taken into account. Marker files (see MARKER_SUFFIX) are skipped.'''
+    acc = hashlib.sha1()
+    def add_entry(entry_path):
+        st = os.lstat(entry_path)
+        relpath = os.path.relpath(entry_path, path)
+        if stat.S_ISDIR(st.st_mode):
+            # its entries are listed anyway, and its mtime would pick up markers
+            acc.update(('%s\n' % relpath).encode('utf-8'))
+        else:
+            acc.update(('%s %d %d\n' % (relpath, st.st_size, st.st_mtime_ns)).encode('utf-8'))
+    tops = [os.path.join(path, name) for name in names] if names else [path]
+    for top in tops:
+        if names:
+            add_entry(top)
+        for root, dirs, files in os.walk(top):
+            dirs.sort()
+            for name in sorted(dirs + files):
+                if name.endswith(MARKER_SUFFIX):
+                    continue
+                add_entry(os.path.join(root, name))
+    return acc.hexdigest()
+
+def file_state(path, *extra):
+    '''Return a string identifying the current size and modification time of
+       path together with extra, to later tell whether path changed.'''
+    st = os.stat(path)
+    return ' '.join([str(st.st_size), str(st.st_mtime_ns)] + [str(e) for e in extra])
+
+def marker_matches(marker_path, content):
+    '''Whether marker_path was written by write_marker() with content'''
+    try:
+        with open(marker_path, 'r') as f:
+            return f.read() == content
+    except OSError:
+        return False
+
+def write_marker(marker_path, content):
+    with open(marker_path, 'w') as f:
+        f.write(content)
+
 def md5(of_content):
     if isinstance(of_content, str):
         of_content = of_content.encode('utf-8')
@@ -452,6 +520,8 @@ def input_polling(prompt, poll_func):
     input_thread.join()
     return input_thread.result
 
+# Only a handful of distinct strings are ever passed in, cache the results:
+@functools.lru_cache(maxsize=32)
 def str2bool(val):
     if val is None or not val:
         return False
@@ -23,7 +23,6 @@ import pprint
 from ..core import log, util, config, template, process, remote
 from ..core.event_loop import MainLoop
 from . import enb
-from . import rfemu
 from .srslte_common import srslte_common
 
 from ..core import schema
@@ -31,7 +30,10 @@ from ..core import schema
 def on_register_schemas():
     resource_schema = {
         'prerun_scripts[]': schema.STR,
+        'prerun_scripts_early[]': schema.STR,
         'postrun_scripts[]': schema.STR,
+        'prerun_parallel': schema.BOOL_STR,
+        'postrun_parallel': schema.BOOL_STR,
         'remote_dir': schema.STR
         }
     schema.register_resource_schema('enb', resource_schema)
@@ -63,6 +65,63 @@ class srsENB(enb.eNodeB, srslte_common):
     METRICSFILE = 'srsenb_metrics.csv'
     INTERCEPTORFILE = 'srsenb_minterceptor.log'
 
+    # Files placed in the run dir, as (attribute, filename). The path on the
+    # remote host, if any, is stored in attribute 'remote_' + attribute.
+    RUN_DIR_FILES = (('config_file', CFGFILE),
+                     ('config_sib_file', CFGFILE_SIB),
+                     ('config_rr_file', CFGFILE_RR),
+                     ('config_drb_file', CFGFILE_DRB),
+                     ('log_file', LOGFILE),
+                     ('pcap_file', PCAPFILE),
+                     ('s1ap_pcap_file', S1AP_PCAPFILE),
+                     ('metrics_file', METRICSFILE),
+                     ('tracing_file', TRACINGFILE),
+                     ('interceptor_file', INTERCEPTORFILE))
+
+    # Config values holding paths of run dir files, as (config key, attribute):
+    CONF_FILENAMES = (('metrics_filename', 'metrics_file'),
+                      ('tracing_filename', 'tracing_file'),
+                      ('sib_filename', 'config_sib_file'),
+                      ('rr_filename', 'config_rr_file'),
+                      ('drb_filename', 'config_drb_file'),
+                      ('log_filename', 'log_file'),
+                      ('pcap_filename', 'pcap_file'),
+                      ('s1ap_pcap_filename', 's1ap_pcap_file'))
+
+    # Additional UHD rf_dev_args for B2XX, by (siso/mimo, num_prb range)
+    UHD_B200_ARGS = { ('siso', 'lt25') : 'send_frame_size=512,recv_frame_size=512',
+                      ('siso', 'eq25') : 'send_frame_size=1024,recv_frame_size=1024',
+                      ('siso', 'gt25') : '',
+                      ('mimo', 'le50') : 'num_recv_frames=64,num_send_frames=64',
+                      # Reduce over the wire format to sc12
+                      ('mimo', 'gt50') : 'num_recv_frames=64,num_send_frames=64,otw_format=sc12' }
+
+    # The max rate for a single UE per PRB configuration in TM1 with MCS 28
+    MAX_PHY_RATE_TM1_DL = { 6 : 3.3e6,
+                            15 : 11e6,
+                            25 : 18e6,
+                            50 : 36e6,
+                            75 : 55e6,
+                            100 : 75e6 }
+    MAX_PHY_RATE_TM1_DL_QAM256 = { 6 : 4.4e6,
+                                   15 : 14e6,
+                                   25 : 24e6,
+                                   50 : 49e6,
+                                   75 : 75e6,
+                                   100 : 98e6 }
+    MAX_PHY_RATE_TM1_UL = { 6 : 1.7e6,
+                            15 : 4.7e6,
+                            25 : 10e6,
+                            50 : 23e6,
+                            75 : 34e6,
+                            100 : 51e6 }
+    MAX_PHY_RATE_TM1_UL_QAM64 = { 6 : 2.7e6,
+                                  15 : 6.5e6,
+                                  25 : 14e6,
+                                  50 : 32e6,
+                                  75 : 34e6,
+                                  100 : 71e6 }
+
     def __init__(self, testenv, conf):
         super().__init__(testenv, conf, srsENB.BINFILE)
         srslte_common.__init__(self)
@@ -120,30 +179,17 @@ class srsENB(enb.eNodeB, srslte_common):
         self.scp_back_metrics(raiseException=False)
 
         # copy back files (may not exist, for instance if there was an early error of process):
-        try:
-            self.rem_host.scpfrom('scp-back-log', self.remote_log_file, self.log_file)
-        except Exception as e:
-            self.log(repr(e))
+        files = [srsENB.LOGFILE]
         if self.enable_pcap:
-            try:
-                self.rem_host.scpfrom('scp-back-pcap', self.remote_pcap_file, self.pcap_file)
-            except Exception as e:
-                self.log(repr(e))
-            try:
-                self.rem_host.scpfrom('scp-back-s1-pcap', self.remote_s1ap_pcap_file, self.s1ap_pcap_file)
-            except Exception as e:
-                self.log(repr(e))
+            files += [srsENB.PCAPFILE, srsENB.S1AP_PCAPFILE]
         if self.enable_tracing:
-            try:
-                self.rem_host.scpfrom('scp-back-tracing', self.remote_tracing_file, self.tracing_file)
-            except Exception as e:
-                self.log(repr(e))
-
+            files.append(srsENB.TRACINGFILE)
         if self.enable_malloc_interceptor:
-            try:
-                self.rem_host.scpfrom('scp-back-interceptor', self.remote_interceptor_file, self.interceptor_file)
-            except Exception as e:
-                self.log(repr(e))
+            files.append(srsENB.INTERCEPTORFILE)
+        try:
+            self.rem_host.scpfrom_bundle('scp-back-files', self.remote_run_dir, files, self.run_dir)
+        except Exception as e:
+            self.log(repr(e))
 
         # Collect KPIs for each TC
         self.testenv.test().set_kpis(self.get_kpi_tree())
@@ -173,50 +219,13 @@ class srsENB(enb.eNodeB, srslte_common):
         else:
             self.dbg('Metrics have already been copied back')
 
-    def run_task(self, task):
-        # Get the arguments.
-        args_index = task.find('args=')
-
-        args = ()
-        # No arguments, all the string is the script.
-        if args_index == -1:
-            index = task.rfind('/')
-            task_name = task [index + 1:]
-            run_dir = util.Dir(self.run_dir.new_dir(task_name))
-            args = (task,)
-            self.log(f'task name is: {task_name}')
-            self.log(f'Running the script: {task} in the run dir: {run_dir}')
-        else:
-            ntask = task[:args_index - 1]
-            index = ntask.rfind('/')
-            task_name = ntask [index + 1:]
-            run_dir = util.Dir(self.run_dir.new_dir(task_name))
-            args = (ntask,)
-            args += tuple(task[args_index + 5:].split(','))
-            self.log(f'task name is: {task_name}')
-            self.log(f'Running the script: {task} in the run dir: {run_dir} with args: {args}')
-
-        proc = process.Process(task_name, run_dir, args)
-        # Set the timeout to a high value 20 minutes.
-        proc.set_default_wait_timeout(1200)
-        returncode = proc.launch_sync()
-        if returncode != 0:
-            raise log.Error('Error executing the pre run scripts. Aborting')
-            return False
-
-        return True
-
     # Runs all the tasks that are intended to run before the execution of the eNodeb.
     def prerun_tasks(self):
         prerun_tasklist = self._conf.get('prerun_scripts', None)
         if not prerun_tasklist:
             return True
 
-        for task in prerun_tasklist:
-            if not self.run_task(task):
-                return False
-
-        return True
+        return self.run_tasks(prerun_tasklist, util.str2bool(self._conf.get('prerun_parallel', 'false')))
 
     # Runs all the tasks that are intended to run after the execution of the eNodeb.
     def postrun_tasks(self):
@@ -224,17 +233,22 @@ class srsENB(enb.eNodeB, srslte_common):
         if not postrun_tasklist:
             return True
 
-        for task in postrun_tasklist:
-            if not self.run_task(task):
-                return False
-
-        return True
+        return self.run_tasks(postrun_tasklist, util.str2bool(self._conf.get('postrun_parallel', 'false')))
 
     def start(self, epc):
         self.log('Starting srsENB')
         self._epc = epc
         self.run_dir = util.Dir(self.testenv.test().get_run_dir().new_dir(self.name()))
-        self.configure()
+
+        # Early pre run tasks don't depend on the eNodeB configuration, run
+        # them in the background while configuring:
+        early_procs = self.launch_tasks(self._conf.get('prerun_scripts_early', None) or [])
+        try:
+            self.configure()
+        except Exception as e:
+            self.stop_tasks(early_procs)
+            raise e
+        self.wait_tasks(early_procs)
 
         if not self.prerun_tasks():
             self.log('Pre run tasks failed. Aborting')
@@ -265,14 +279,13 @@ class srsENB(enb.eNodeB, srslte_common):
             remote_env['LD_PRELOAD'] = path
 
         remote_binary = self.remote_inst.child('bin', srsENB.BINFILE)
-        args = (remote_binary, self.remote_config_file)
-        args += tuple(self._additional_args)
+        args = [remote_binary, self.remote_config_file, *self._additional_args]
 
         # Force the output of the malloc interceptor to the interceptor_file.
         if self.enable_malloc_interceptor:
-            args += tuple([f" 2> {self.remote_interceptor_file}"])
+            args.append(f" 2> {self.remote_interceptor_file}")
 
-        self.process = self.rem_host.RemoteProcessSafeExit(srsENB.BINFILE, self.remote_run_dir, args, remote_env=remote_env, wait_time_sec=7)
+        self.process = self.rem_host.RemoteProcessSafeExit(srsENB.BINFILE, self.remote_run_dir, tuple(args), remote_env=remote_env, wait_time_sec=7)
         self.testenv.remember_to_stop(self.process)
         self.process.launch()
 
@@ -280,8 +293,7 @@ class srsENB(enb.eNodeB, srslte_common):
         binary = self.inst.child('bin', srsENB.BINFILE)
         lib = self.inst.child('lib')
         env = { 'LD_LIBRARY_PATH': util.prepend_library_path(lib) }
-        args = (binary, os.path.abspath(self.config_file))
-        args += tuple(self._additional_args)
+        args = (binary, os.path.abspath(self.config_file), *self._additional_args)
 
         self.process = process.Process(self.name(), self.run_dir, args, env=env)
         self.testenv.remember_to_stop(self.process)
@@ -296,24 +308,19 @@ class srsENB(enb.eNodeB, srslte_common):
             f.write(r)
 
     def configure(self):
+        is_local = self._run_node.is_local()
         self.inst = util.Dir(os.path.abspath(self.testenv.suite().trial().get_inst('srslte',  self._run_node.run_label())))
-        if not os.path.isdir(self.inst.child('lib')):
+        inst_entries = self.inst.scan()
+        if 'lib' not in inst_entries or not inst_entries['lib'].is_dir():
             raise log.Error('No lib/ in', self.inst)
-        if not self.inst.isfile('bin', srsENB.BINFILE):
+        bin_entries = self.inst.scan('bin') if 'bin' in inst_entries else {}
+        if srsENB.BINFILE not in bin_entries or not bin_entries[srsENB.BINFILE].is_file():
             raise log.Error('No %s binary in' % srsENB.BINFILE, self.inst)
 
-        self.config_file = self.run_dir.child(srsENB.CFGFILE)
-        self.config_sib_file = self.run_dir.child(srsENB.CFGFILE_SIB)
-        self.config_rr_file = self.run_dir.child(srsENB.CFGFILE_RR)
-        self.config_drb_file = self.run_dir.child(srsENB.CFGFILE_DRB)
-        self.log_file = self.run_dir.child(srsENB.LOGFILE)
-        self.pcap_file = self.run_dir.child(srsENB.PCAPFILE)
-        self.s1ap_pcap_file = self.run_dir.child(srsENB.S1AP_PCAPFILE)
-        self.metrics_file = self.run_dir.child(srsENB.METRICSFILE)
-        self.tracing_file = self.run_dir.child(srsENB.TRACINGFILE)
-        self.interceptor_file = self.run_dir.child(srsENB.INTERCEPTORFILE)
-
-        if not self._run_node.is_local():
+        for attr, filename in srsENB.RUN_DIR_FILES:
+            setattr(self, attr, self.run_dir.child(filename))
+
+        if not is_local:
             self.rem_host = remote.RemoteHost(self.run_dir, self._run_node.ssh_user(), self._run_node.ssh_addr())
             remote_prefix_dir = util.Dir(srsENB.REMOTE_DIR)
 
@@ -326,91 +333,56 @@ class srsENB(enb.eNodeB, srslte_common):
             self.remote_inst = util.Dir(remote_prefix_dir.child(os.path.basename(str(self.inst))))
             self.remote_run_dir = util.Dir(remote_prefix_dir.child(self.name()))
 
-            self.remote_config_file = self.remote_run_dir.child(srsENB.CFGFILE)
-            self.remote_config_sib_file = self.remote_run_dir.child(srsENB.CFGFILE_SIB)
-            self.remote_config_rr_file = self.remote_run_dir.child(srsENB.CFGFILE_RR)
-            self.remote_config_drb_file = self.remote_run_dir.child(srsENB.CFGFILE_DRB)
-            self.remote_log_file = self.remote_run_dir.child(srsENB.LOGFILE)
-            self.remote_pcap_file = self.remote_run_dir.child(srsENB.PCAPFILE)
-            self.remote_s1ap_pcap_file = self.remote_run_dir.child(srsENB.S1AP_PCAPFILE)
-            self.remote_metrics_file = self.remote_run_dir.child(srsENB.METRICSFILE)
-            self.remote_tracing_file = self.remote_run_dir.child(srsENB.TRACINGFILE)
-            self.remote_interceptor_file = self.remote_run_dir.child(srsENB.INTERCEPTORFILE)
+            for attr, filename in srsENB.RUN_DIR_FILES:
+                setattr(self, 'remote_' + attr, self.remote_run_dir.child(filename))
 
         values = super().configure(['srsenb'])
-
-        metricsfile = self.metrics_file if self._run_node.is_local() else self.remote_metrics_file
-        tracingfile = self.tracing_file if self._run_node.is_local() else self.remote_tracing_file
-        sibfile = self.config_sib_file if self._run_node.is_local() else self.remote_config_sib_file
-        rrfile = self.config_rr_file if self._run_node.is_local() else self.remote_config_rr_file
-        drbfile = self.config_drb_file if self._run_node.is_local() else self.remote_config_drb_file
-        logfile = self.log_file if self._run_node.is_local() else self.remote_log_file
-        pcapfile = self.pcap_file if self._run_node.is_local() else self.remote_pcap_file
-        s1ap_pcapfile = self.s1ap_pcap_file if self._run_node.is_local() else self.remote_s1ap_pcap_file
-        config.overlay(values, dict(enb=dict(metrics_filename=metricsfile,
-                                             tracing_filename=tracingfile,
-                                             sib_filename=sibfile,
-                                             rr_filename=rrfile,
-                                             drb_filename=drbfile,
-                                             log_filename=logfile,
-                                             pcap_filename=pcapfile,
-                                             s1ap_pcap_filename=s1ap_pcapfile,
-                                             )))
+        enb_conf = values['enb']
 
         # Retrieve the malloc interceptor option.
-        self.enable_malloc_interceptor = util.str2bool(values['enb'].get('enable_malloc_interceptor', 'false'))
+        self.enable_malloc_interceptor = util.str2bool(enb_conf.get('enable_malloc_interceptor', 'false'))
 
         # Convert parsed boolean string to Python boolean:
-        self.enable_pcap = util.str2bool(values['enb'].get('enable_pcap', 'false'))
-        config.overlay(values, dict(enb={'enable_pcap': self.enable_pcap}))
-
-        self.enable_tracing = util.str2bool(values['enb'].get('enable_tracing', 'false'))
-        config.overlay(values, dict(enb={'enable_tracing': self.enable_tracing}))
-
-        self.enable_ul_qam64 = util.str2bool(values['enb'].get('enable_ul_qam64', 'false'))
-        config.overlay(values, dict(enb={'enable_ul_qam64': self.enable_ul_qam64}))
-
-        config.overlay(values, dict(enb={'enable_dl_awgn': util.str2bool(values['enb'].get('enable_dl_awgn', 'false'))}))
-        config.overlay(values, dict(enb={'rf_dev_sync': values['enb'].get('rf_dev_sync', None)}))
+        self.enable_pcap = util.str2bool(enb_conf.get('enable_pcap', 'false'))
+        self.enable_tracing = util.str2bool(enb_conf.get('enable_tracing', 'false'))
+        self.enable_ul_qam64 = util.str2bool(enb_conf.get('enable_ul_qam64', 'false'))
+
+        # All programatically set values are collected here and applied with a
+        # single overlay. File paths are the ones where srsenb actually runs:
+        attr_prefix = '' if is_local else 'remote_'
+        enb_values = {key: getattr(self, attr_prefix + attr) for key, attr in srsENB.CONF_FILENAMES}
+        enb_values.update(enable_pcap=self.enable_pcap,
+                          enable_tracing=self.enable_tracing,
+                          enable_ul_qam64=self.enable_ul_qam64,
+                          enable_dl_awgn=util.str2bool(enb_conf.get('enable_dl_awgn', 'false')),
+                          rf_dev_sync=enb_conf.get('rf_dev_sync', None))
 
         self._additional_args = []
-        for add_args in values['enb'].get('additional_args', []):
+        for add_args in enb_conf.get('additional_args', []):
             self._additional_args += add_args.split()
 
         # We need to set some specific variables programatically here to match IP addresses:
         if self._conf.get('rf_dev_type') == 'zmq':
-            rf_dev_args = self.get_zmq_rf_dev_args(values)
-            config.overlay(values, dict(enb=dict(rf_dev_args=rf_dev_args)))
+            enb_values['rf_dev_args'] = self.get_zmq_rf_dev_args(values)
 
         # Set UHD frame size as a function of the cell bandwidth on B2XX
-        if self._conf.get('rf_dev_type') == 'uhd' and values['enb'].get('rf_dev_args', None) is not None:
-            if 'b200' in values['enb'].get('rf_dev_args'):
-                rf_dev_args = values['enb'].get('rf_dev_args', '')
-                rf_dev_args += ',' if rf_dev_args != '' and not rf_dev_args.endswith(',') else ''
-
-                if self._num_prb == 75:
-                    rf_dev_args += 'master_clock_rate=15.36e6,'
-
+        if self._conf.get('rf_dev_type') == 'uhd' and enb_conf.get('rf_dev_args', None) is not None:
+            if 'b200' in enb_conf.get('rf_dev_args'):
                 if self._txmode <= 2:
-                    # SISO config
-                    if self._num_prb < 25:
-                        rf_dev_args += 'send_frame_size=512,recv_frame_size=512'
-                    elif self._num_prb == 25:
-                        rf_dev_args += 'send_frame_size=1024,recv_frame_size=1024'
-                    else:
-                        rf_dev_args += ''
+                    mode = 'siso'
+                    prb_range = 'lt25' if self._num_prb < 25 else 'eq25' if self._num_prb == 25 else 'gt25'
                 else:
-                    # MIMO config
-                    rf_dev_args += 'num_recv_frames=64,num_send_frames=64'
-                    if self._num_prb > 50:
-                        # Reduce over the wire format to sc12
-                        rf_dev_args += ',otw_format=sc12'
-
-                config.overlay(values, dict(enb=dict(rf_dev_args=rf_dev_args)))
+                    mode = 'mimo'
+                    prb_range = 'le50' if self._num_prb <= 50 else 'gt50'
+                rf_dev_args = (enb_conf.get('rf_dev_args').rstrip(','),
+                               'master_clock_rate=15.36e6' if self._num_prb == 75 else '',
+                               srsENB.UHD_B200_ARGS[(mode, prb_range)])
+                enb_values['rf_dev_args'] = ','.join([arg for arg in rf_dev_args if arg])
 
         if self._conf.get('rf_dev_type') == 'fapi':
-            rf_dev_args = ''
-            config.overlay(values, dict(enb=dict(rf_dev_args=rf_dev_args)))
+            enb_values['rf_dev_args'] = ''
+
+        config.overlay(values, dict(enb=enb_values))
 
         self.gen_conf = values
 
@@ -419,14 +391,12 @@ class srsENB(enb.eNodeB, srslte_common):
         self.gen_conf_file(self.config_rr_file, srsENB.CFGFILE_RR, values)
         self.gen_conf_file(self.config_drb_file, srsENB.CFGFILE_DRB, values)
 
-        if not self._run_node.is_local():
-            self.rem_host.recreate_remote_dir(self.remote_inst)
-            self.rem_host.scp('scp-inst-to-remote', str(self.inst), remote_prefix_dir)
+        if not is_local:
+            self.rem_host.sync_inst_dir(self.inst, remote_prefix_dir)
             self.rem_host.recreate_remote_dir(self.remote_run_dir)
-            self.rem_host.scp('scp-cfg-to-remote', self.config_file, self.remote_config_file)
-            self.rem_host.scp('scp-cfg-sib-to-remote', self.config_sib_file, self.remote_config_sib_file)
-            self.rem_host.scp('scp-cfg-rr-to-remote', self.config_rr_file, self.remote_config_rr_file)
-            self.rem_host.scp('scp-cfg-drb-to-remote', self.config_drb_file, self.remote_config_drb_file)
+            self.rem_host.scp_bundle('scp-cfg-to-remote', self.run_dir,
+                                     (srsENB.CFGFILE, srsENB.CFGFILE_SIB, srsENB.CFGFILE_RR, srsENB.CFGFILE_DRB),
+                                     self.remote_run_dir)
 
     def ue_add(self, ue):
         if self.ue is not None:
@@ -456,40 +426,20 @@ class srsENB(enb.eNodeB, srslte_common):
              config.overlay(rfemu_cfg, dict(enb=self,
                                             cell_id=cell_list[cell]['cell_id']))
 
+        from . import rfemu
         rfemu_obj = rfemu.get_instance_by_type(rfemu_cfg['type'], rfemu_cfg)
         return rfemu_obj
 
     def ue_max_rate(self, downlink=True, num_carriers=1):
-        # The max rate for a single UE per PRB configuration in TM1 with MCS 28
         if 'dl_qam256' in self.ue.features():
-            max_phy_rate_tm1_dl = {6: 4.4e6,
-                                   15: 14e6,
-                                   25: 24e6,
-                                   50: 49e6,
-                                   75: 75e6,
-                                   100: 98e6}
+            max_phy_rate_tm1_dl = srsENB.MAX_PHY_RATE_TM1_DL_QAM256
         else:
-            max_phy_rate_tm1_dl = {6: 3.3e6,
-                                   15: 11e6,
-                                   25: 18e6,
-                                   50: 36e6,
-                                   75: 55e6,
-                                   100: 75e6}
+            max_phy_rate_tm1_dl = srsENB.MAX_PHY_RATE_TM1_DL
 
         if self.enable_ul_qam64 and 'ul_qam64' in self.ue.features():
-            max_phy_rate_tm1_ul = { 6 : 2.7e6,
-                                    15 : 6.5e6,
-                                    25 : 14e6,
-                                    50 : 32e6,
-                                    75 : 34e6,
-                                    100 : 71e6 }
+            max_phy_rate_tm1_ul = srsENB.MAX_PHY_RATE_TM1_UL_QAM64
         else:
-            max_phy_rate_tm1_ul = { 6 : 1.7e6,
-                                    15 : 4.7e6,
-                                    25 : 10e6,
-                                    50 : 23e6,
-                                    75 : 34e6,
-                                    100 : 51e6 }
+            max_phy_rate_tm1_ul = srsENB.MAX_PHY_RATE_TM1_UL
 
         if downlink:
             max_rate = max_phy_rate_tm1_dl[self.num_prb()]
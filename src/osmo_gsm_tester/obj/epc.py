@@ -20,6 +20,7 @@
 from abc import ABCMeta, abstractmethod
 from ..core import log, config
 from ..core import schema
+from ..core.event_loop import MainLoop
 
 def on_register_schemas():
     config_schema = {
@@ -47,7 +48,7 @@ class EPC(log.Origin, metaclass=ABCMeta):
         config.overlay(values, dict(epc=self.testenv.suite().config().get('epc', {})))
         for config_specifics in config_specifics_li:
             config.overlay(values, dict(epc=self.testenv.suite().config().get(config_specifics, {})))
-        config.overlay(values, dict(epc={'run_addr': self.addr()}))
+        values['epc']['run_addr'] = self.addr()
         return values
 
 ########################
@@ -105,6 +106,10 @@ class EPC(log.Origin, metaclass=ABCMeta):
     def enb_is_connected(self, enb):
         pass
 
+    def wait_enb_connected(self, enb, timeout=300):
+        'Wait until enb_is_connected(enb). Subclass can override to get notified earlier.'
+        MainLoop.wait(self.enb_is_connected, enb, timeout=timeout)
+
     @abstractmethod
     def running(self):
         pass
@@ -19,8 +19,9 @@
 
 import os
 import pprint
+import collections
 
-from ..core import log, util, config, template, process, remote
+from ..core import log, util, template, process, remote
 from ..core import schema
 from . import epc
 from .srslte_common import srslte_common
@@ -32,6 +33,14 @@ def on_register_schemas():
         }
     schema.register_config_schema('epc', config_schema)
 
+# Sample stdout line: "S1 Setup Request - eNB Name: srsenb01, eNB id: 0x19"
+S1_SETUP_NEEDLE = b'S1 Setup Request'
+S1_SETUP_ENB_ID_SEP = b'eNB id: '
+
+# One entry of the HSS user db. qci is the same for all subscribers and taken
+# from the epc config when rendering.
+Subscriber = collections.namedtuple('Subscriber', ['id', 'imsi', 'msisdn', 'auth_algo', 'ki', 'opc', 'apn_ipaddr'])
+
 class srsEPC(epc.EPC, srslte_common):
 
     REMOTE_DIR = '/osmo-gsm-tester-srsepc'
@@ -40,6 +49,7 @@ class srsEPC(epc.EPC, srslte_common):
     DBFILE = 'srsepc_user_db.csv'
     PCAPFILE = 'srsepc.pcap'
     LOGFILE = 'srsepc.log'
+    PREPARED_MARKER = '.srsepc' + util.MARKER_SUFFIX
 
     def __init__(self, testenv, run_node):
         super().__init__(testenv, run_node, 'srsepc')
@@ -52,12 +62,16 @@ class srsEPC(epc.EPC, srslte_common):
         self.process = None
         self.rem_host = None
         self.remote_inst = None
+        self.remote_run_dir = None
         self.remote_config_file = None
         self.remote_db_file = None
         self.remote_log_file = None
         self.remote_pcap_file = None
         self.enable_pcap = False
         self.subscriber_list = []
+        self._s1_stdout_path = None
+        self._s1_stdout_mark = 0
+        self._s1_enb_ids = set()
 
     def cleanup(self):
         if self.process is None:
@@ -65,15 +79,13 @@ class srsEPC(epc.EPC, srslte_common):
         if self._run_node.is_local():
             return
         # copy back files (may not exist, for instance if there was an early error of process):
+        files = [srsEPC.LOGFILE]
+        if self.enable_pcap:
+            files.append(srsEPC.PCAPFILE)
         try:
-            self.rem_host.scpfrom('scp-back-log', self.remote_log_file, self.log_file)
+            self.rem_host.scpfrom_bundle('scp-back-files', self.remote_run_dir, files, self.run_dir)
         except Exception as e:
             self.log(repr(e))
-        if self.enable_pcap:
-            try:
-                self.rem_host.scpfrom('scp-back-pcap', self.remote_pcap_file, self.pcap_file)
-            except Exception as e:
-                self.log(repr(e))
 
     def start(self):
         self.log('Starting srsepc')
@@ -89,11 +101,13 @@ class srsEPC(epc.EPC, srslte_common):
         remote_binary = self.remote_inst.child('bin', srsEPC.BINFILE)
 
         # setting capabilities will later disable use of LD_LIBRARY_PATH from ELF loader -> modify RPATH instead.
-        self.log('Setting RPATH for srsepc')
-        self.rem_host.change_elf_rpath(remote_binary, remote_lib)
         # srsepc requires CAP_NET_ADMIN to create tunnel devices: ioctl(TUNSETIFF):
-        self.log('Applying CAP_NET_ADMIN capability to srsepc')
-        self.rem_host.setcap_net_admin(remote_binary)
+        # Both are done in one go, and skipped if already done on the current
+        # remote inst dir, since the marker is gone whenever it is recreated:
+        self.log('Setting RPATH and applying CAP_NET_ADMIN capability to srsepc')
+        self.rem_host.run_remote_sync_once('prepare-srsepc', self.remote_inst.child('bin', srsEPC.PREPARED_MARKER), remote_lib,
+                                           self.rem_host.change_elf_rpath_args(remote_binary, remote_lib),
+                                           self.rem_host.setcap_net_admin_args(remote_binary))
 
         args = (remote_binary, self.remote_config_file)
 
@@ -106,13 +120,21 @@ class srsEPC(epc.EPC, srslte_common):
         lib = self.inst.child('lib')
         env = {}
 
-        # setting capabilities will later disable use of LD_LIBRARY_PATH from ELF loader -> modify RPATH instead.
-        self.log('Setting RPATH for srsepc')
-        # srsepc binary needs patchelf <= 0.9 (0.10 and current master fail) to avoid failing during patch. OS#4389, patchelf-GH#192.
-        util.change_elf_rpath(binary, util.prepend_library_path(lib), self.run_dir.new_dir('patchelf'))
-        # srsepc requires CAP_NET_ADMIN to create tunnel devices: ioctl(TUNSETIFF):
-        self.log('Applying CAP_NET_ADMIN capability to srsepc')
-        util.setcap_net_admin(binary, self.run_dir.new_dir('setcap_net_admin'))
+        rpath = util.prepend_library_path(lib)
+        # Skip patching if it was already done for this same binary and rpath:
+        marker = self.inst.child('bin', srsEPC.PREPARED_MARKER)
+        if util.marker_matches(marker, util.file_state(binary, rpath)):
+            self.dbg('srsepc binary already prepared, skipping patchelf and setcap')
+        else:
+            # setting capabilities will later disable use of LD_LIBRARY_PATH from ELF loader -> modify RPATH instead.
+            self.log('Setting RPATH for srsepc')
+            # srsepc binary needs patchelf <= 0.9 (0.10 and current master fail) to avoid failing during patch. OS#4389, patchelf-GH#192.
+            # Each Process creates its run dir when opening its output logs, no need to mkdir here:
+            util.change_elf_rpath(binary, rpath, self.run_dir.child('patchelf'))
+            # srsepc requires CAP_NET_ADMIN to create tunnel devices: ioctl(TUNSETIFF):
+            self.log('Applying CAP_NET_ADMIN capability to srsepc')
+            util.setcap_net_admin(binary, self.run_dir.child('setcap_net_admin'))
+            util.write_marker(marker, util.file_state(binary, rpath))
 
         args = (binary, os.path.abspath(self.config_file))
 
@@ -122,9 +144,11 @@ class srsEPC(epc.EPC, srslte_common):
 
     def configure(self):
         self.inst = util.Dir(os.path.abspath(self.testenv.suite().trial().get_inst('srslte', self._run_node.run_label())))
-        if not os.path.isdir(self.inst.child('lib')):
+        inst_entries = self.inst.scan()
+        if 'lib' not in inst_entries or not inst_entries['lib'].is_dir():
             raise log.Error('No lib/ in', self.inst)
-        if not self.inst.isfile('bin', srsEPC.BINFILE):
+        bin_entries = self.inst.scan('bin') if 'bin' in inst_entries else {}
+        if srsEPC.BINFILE not in bin_entries or not bin_entries[srsEPC.BINFILE].is_file():
             raise log.Error('No %s binary in' % srsEPC.BINFILE, self.inst)
 
         self.config_file = self.run_dir.child(srsEPC.CFGFILE)
@@ -136,32 +160,29 @@ class srsEPC(epc.EPC, srslte_common):
             self.rem_host = remote.RemoteHost(self.run_dir, self._run_node.ssh_user(), self._run_node.ssh_addr())
             remote_prefix_dir = util.Dir(srsEPC.REMOTE_DIR)
             self.remote_inst = util.Dir(remote_prefix_dir.child(os.path.basename(str(self.inst))))
-            remote_run_dir = util.Dir(remote_prefix_dir.child(srsEPC.BINFILE))
+            self.remote_run_dir = util.Dir(remote_prefix_dir.child(srsEPC.BINFILE))
 
-            self.remote_config_file = remote_run_dir.child(srsEPC.CFGFILE)
-            self.remote_db_file = remote_run_dir.child(srsEPC.DBFILE)
-            self.remote_log_file = remote_run_dir.child(srsEPC.LOGFILE)
-            self.remote_pcap_file = remote_run_dir.child(srsEPC.PCAPFILE)
+            self.remote_config_file = self.remote_run_dir.child(srsEPC.CFGFILE)
+            self.remote_db_file = self.remote_run_dir.child(srsEPC.DBFILE)
+            self.remote_log_file = self.remote_run_dir.child(srsEPC.LOGFILE)
+            self.remote_pcap_file = self.remote_run_dir.child(srsEPC.PCAPFILE)
 
         values = super().configure(['srsepc'])
 
         dbfile = self.db_file if self._run_node.is_local() else self.remote_db_file
         logfile = self.log_file if self._run_node.is_local() else self.remote_log_file
         pcapfile = self.pcap_file if self._run_node.is_local() else self.remote_pcap_file
-        config.overlay(values, dict(epc=dict(db_filename=dbfile,
-                                             log_filename=logfile,
-                                             pcap_filename=pcapfile)))
-
         # Convert parsed boolean string to Python boolean:
         self.enable_pcap = util.str2bool(values['epc'].get('enable_pcap', 'false'))
-        config.overlay(values, dict(epc={'enable_pcap': self.enable_pcap}))
+        # All of these are plain leaves, no need for a deep config.overlay():
+        values['epc'].update(db_filename=dbfile,
+                             log_filename=logfile,
+                             pcap_filename=pcapfile,
+                             enable_pcap=self.enable_pcap)
 
-        # Set qci for each subscriber:
-        qci = values['epc'].get('qci', None)
-        assert qci is not None
-        for i in range(len(self.subscriber_list)):
-            self.subscriber_list[i]['qci'] = qci
-        config.overlay(values, dict(epc=dict(hss=dict(subscribers=self.subscriber_list))))
+        # qci is applied to each subscriber by the user db template:
+        assert values['epc'].get('qci', None) is not None
+        values['epc'].setdefault('hss', {})['subscribers'] = self.subscriber_list
 
         self.dbg('SRSEPC CONFIG:\n' + pprint.pformat(values))
 
@@ -169,17 +190,17 @@ class srsEPC(epc.EPC, srslte_common):
             r = template.render(srsEPC.CFGFILE, values)
             self.dbg(r)
             f.write(r)
+        # The user db grows with the subscriber count, stream it to the file:
         with open(self.db_file, 'w') as f:
-            r = template.render(srsEPC.DBFILE, values)
-            self.dbg(r)
-            f.write(r)
+            template.render_to_file(srsEPC.DBFILE, values, f)
+        self.dbg('Rendered', db_file=self.db_file)
 
         if not self._run_node.is_local():
-            self.rem_host.recreate_remote_dir(self.remote_inst)
-            self.rem_host.scp('scp-inst-to-remote', str(self.inst), remote_prefix_dir)
-            self.rem_host.recreate_remote_dir(remote_run_dir)
-            self.rem_host.scp('scp-cfg-to-remote', self.config_file, self.remote_config_file)
-            self.rem_host.scp('scp-db-to-remote', self.db_file, self.remote_db_file)
+            # srsepc doesn't need anything else from the srslte inst dir:
+            self.rem_host.sync_inst_dir(self.inst, remote_prefix_dir, (os.path.join('bin', srsEPC.BINFILE), 'lib'))
+            self.rem_host.recreate_remote_dir(self.remote_run_dir)
+            self.rem_host.scp_bundle('scp-cfg-to-remote', self.run_dir, (srsEPC.CFGFILE, srsEPC.DBFILE),
+                                     self.remote_run_dir)
 
     def subscriber_add(self, modem, msisdn=None, algo_str=None):
         if msisdn is None:
@@ -199,19 +220,31 @@ class srsEPC(epc.EPC, srslte_common):
 
         opc = (modem.opc() or '')
         subscriber_id = len(self.subscriber_list) # list index
-        self.subscriber_list.append({'id': subscriber_id, 'imsi': modem.imsi(), 'msisdn': msisdn, 'auth_algo': algo_str, 'ki': modem.ki(), 'opc': opc, 'apn_ipaddr': modem.apn_ipaddr()})
+        self.subscriber_list.append(Subscriber(id=subscriber_id, imsi=modem.imsi(), msisdn=msisdn, auth_algo=algo_str, ki=modem.ki(), opc=opc, apn_ipaddr=modem.apn_ipaddr()))
 
         self.log('Add subscriber', msisdn=msisdn, imsi=modem.imsi(), subscriber_id=subscriber_id,
                  algo_str=algo_str)
         return subscriber_id
 
     def enb_is_connected(self, enb):
-        # Match against sample line: "S1 Setup Request - eNB Name: srsenb01, eNB id: 0x19"
-        stdout_lines = (self.process.get_stdout() or '').splitlines()
-        for l in stdout_lines:
-            if l.startswith('S1 Setup Request') and l.endswith('eNB id: %s' % hex(enb.id()).lower()):
-                return True
-        return False
+        # Only look at the output appended since the last call, remembering
+        # the ids of all eNBs seen so far. Raw bytes are matched, no need to
+        # decode the output:
+        stdout_path = self.process.get_output_file('stdout')
+        if stdout_path != self._s1_stdout_path:
+            self._s1_stdout_path = stdout_path
+            self._s1_stdout_mark = 0
+            self._s1_enb_ids = set()
+        out, self._s1_stdout_mark = self.process.read_output_bytes_since('stdout', self._s1_stdout_mark)
+        if S1_SETUP_NEEDLE in out:
+            for l in out.splitlines():
+                if l.startswith(S1_SETUP_NEEDLE):
+                    self._s1_enb_ids.add(l.rpartition(S1_SETUP_ENB_ID_SEP)[2])
+        return hex(enb.id()).lower().encode() in self._s1_enb_ids
+
+    def wait_enb_connected(self, enb, timeout=300):
+        # Check again as soon as srsepc writes to stdout:
+        self.process.wait_output('stdout', self.enb_is_connected, enb, timeout=timeout)
 
     def running(self):
         return not self.process.terminated()
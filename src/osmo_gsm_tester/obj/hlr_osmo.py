@@ -105,6 +105,26 @@ class OsmoHlr(log.Origin):
             raise log.Error('Exited in error')
 
     def subscriber_add(self, modem, msisdn=None, algo_str=None):
+        subscriber = self._subscriber_prepare(modem, msisdn, algo_str)
+        self._subscribers_insert((subscriber,))
+        return subscriber[0]
+
+    def subscribers_add(self, modems):
+        '''Same as subscriber_add() for each of modems, but writing all of them
+           to the db in a single transaction. Each item is either a modem or a
+           (modem, msisdn, algo_str) tuple passing the same arguments as
+           subscriber_add(). Returns the list of subscriber ids.'''
+        subscribers = []
+        for item in modems:
+            if isinstance(item, tuple):
+                modem, msisdn, algo_str = item
+            else:
+                modem, msisdn, algo_str = item, None, None
+            subscribers.append(self._subscriber_prepare(modem, msisdn, algo_str))
+        self._subscribers_insert(subscribers)
+        return [subscriber[0] for subscriber in subscribers]
+
+    def _subscriber_prepare(self, modem, msisdn, algo_str):
         if msisdn is None:
             msisdn = modem.msisdn()
         subscriber_id = self.next_subscriber_id
@@ -120,17 +140,19 @@ class OsmoHlr(log.Origin):
 
         self.log('Add subscriber', msisdn=msisdn, imsi=modem.imsi(), subscriber_id=subscriber_id,
                  algo_str=algo_str, algo=algo)
+        return (subscriber_id, modem.imsi(), msisdn, algo, modem.ki())
+
+    def _subscribers_insert(self, subscribers):
         conn = sqlite3.connect(self.db_file)
         try:
             c = conn.cursor()
-            c.execute('insert into subscriber (id, imsi, msisdn) values (?, ?, ?)',
-                        (subscriber_id, modem.imsi(), modem.msisdn(),))
-            c.execute('insert into auc_2g (subscriber_id, algo_id_2g, ki) values (?, ?, ?)',
-                        (subscriber_id, algo, modem.ki(),))
+            c.executemany('insert into subscriber (id, imsi, msisdn) values (?, ?, ?)',
+                          [(subscriber_id, imsi, msisdn) for subscriber_id, imsi, msisdn, algo, ki in subscribers])
+            c.executemany('insert into auc_2g (subscriber_id, algo_id_2g, ki) values (?, ?, ?)',
+                          [(subscriber_id, algo, ki) for subscriber_id, imsi, msisdn, algo, ki in subscribers])
             conn.commit()
         finally:
             conn.close()
-        return subscriber_id
 
     def subscriber_delete(self, modem):
         self.log('Add subscriber', imsi=modem.imsi())
@@ -18,6 +18,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import glob
 import pprint
 
 from ..core import log, util, config, template, process, remote
@@ -37,48 +38,55 @@ def on_register_schemas():
         'custom_band_list[].ul_earfcn_min': schema.UINT,
         'custom_band_list[].ul_earfcn_max': schema.UINT,        
         }
-    for key, val in RunNode.schema().items():
-        resource_schema['run_node.%s' % key] = val
+    resource_schema.update({'run_node.%s' % key: val for key, val in RunNode.schema().items()})
     schema.register_resource_schema('modem', resource_schema)
     config_schema = {
         'license_server_addr': schema.IPV4,
         }
     schema.register_config_schema('amarisoft', config_schema)
 
+RF_TYPES = frozenset(('uhd', 'zmq'))
+
 def rf_type_valid(rf_type_str):
-    return rf_type_str in ('uhd', 'zmq')
+    return rf_type_str in RF_TYPES
+
+MAX_NUM_PRB = 110
+
+def num_prb_table(limits):
+    '''Expand a list of (max num_prb, value) ranges into a tuple indexed by num_prb'''
+    return tuple([next(val for limit, val in limits if num_prb <= limit) for num_prb in range(MAX_NUM_PRB + 1)])
 
 #reference: srsLTE.git srslte_symbol_sz()
+SYMBOL_SZ_BY_NUM_PRB = num_prb_table(((6, 128), (15, 256), (50, 768), (75, 1024), (110, 1536)))
+BANDWIDTH_BY_NUM_PRB = num_prb_table(((6, 1.4), (15, 3), (25, 5), (50, 10), (75, 15), (110, 20)))
+
 def num_prb2symbol_sz(num_prb):
-    if num_prb <= 6:
-        return 128
-    if num_prb <= 15:
-        return 256
-    if num_prb <= 50:
-        return 768
-    if num_prb <= 75:
-        return 1024
-    if num_prb <= 110:
-        return 1536
-    raise log.Error('invalid num_prb %r', num_prb)
+    if num_prb > MAX_NUM_PRB:
+        raise log.Error('invalid num_prb %r', num_prb)
+    return SYMBOL_SZ_BY_NUM_PRB[max(num_prb, 0)]
 
 def num_prb2base_srate(num_prb):
     return num_prb2symbol_sz(num_prb) * 15 * 1000
 
 def num_prb2bandwidth(num_prb):
-    if num_prb <= 6:
-        return 1.4
-    if num_prb <= 15:
-        return 3
-    if num_prb <= 25:
-        return 5
-    if num_prb <= 50:
-        return 10
-    if num_prb <= 75:
-        return 15
-    if num_prb <= 110:
-        return 20
-    raise log.Error('invalid num_prb %r', num_prb)
+    if num_prb > MAX_NUM_PRB:
+        raise log.Error('invalid num_prb %r', num_prb)
+    return BANDWIDTH_BY_NUM_PRB[max(num_prb, 0)]
+
+# script + sudoers file available in osmo-gsm-tester.git/utils/{bin,sudoers.d}
+IFUP_TEMPLATE = '''#!/bin/sh
+set -x -e
+ue_id="$1"           # UE ID
+pdn_id="$2"          # PDN unique id (start from 0)
+ifname="$3"          # Interface name
+ipv4_addr="$4"       # IPv4 address
+ipv4_dns="$5"        # IPv4 DNS
+ipv6_local_addr="$6" # IPv6 local address
+ipv6_dns="$7"        # IPv6 DNS
+old_link_local=""
+sudo /usr/local/bin/osmo-gsm-tester_netns_setup.sh "%s" "$ifname" "$ipv4_addr"
+echo "${ue_id}: netns %s configured"
+'''
 
 class AmarisoftUE(MS):
 
@@ -157,17 +165,17 @@ class AmarisoftUE(MS):
 
     def start_remotely(self):
         remote_binary = self.remote_inst.child('', AmarisoftUE.BINFILE)
+        # We also need to patch the arch-optimized binaries that lteue() will
+        # exec() into. The glob is expanded by the remote shell:
+        remote_binaries = (remote_binary, self.remote_inst.child('', 'lteue-*'))
         # setting capabilities will later disable use of LD_LIBRARY_PATH from ELF loader -> modify RPATH instead.
         self.log('Setting RPATH for ltetue')
         # patchelf >= 0.10 is required to support passing several files at once:
-        self.rem_host.change_elf_rpath(remote_binary, str(self.remote_inst))
-        # We also need to patch the arch-optimized binaries that lteue() will exec() into:
-        self.rem_host.change_elf_rpath(self.remote_inst.child('', 'lteue-*'), str(self.remote_inst))
+        self.rem_host.change_elf_rpath(remote_binaries, str(self.remote_inst))
 
         # lteue requires CAP_NET_ADMIN to create tunnel devices: ioctl(TUNSETIFF):
         self.log('Applying CAP_NET_ADMIN capability to ltetue')
-        self.rem_host.setcap_net_admin(remote_binary)
-        self.rem_host.setcap_net_admin(self.remote_inst.child('', 'lteue-*'))
+        self.rem_host.setcap_net_admin(remote_binaries)
 
         args = (remote_binary, self.remote_config_file)
         self.process = self.rem_host.RemoteProcess(AmarisoftUE.BINFILE, args)
@@ -178,16 +186,17 @@ class AmarisoftUE(MS):
         binary = self.inst.child('', AmarisoftUE.BINFILE)
         env = {}
 
+        # We also need to patch the arch-optimized binaries that lteue() will exec() into:
+        binaries = [binary] + sorted(glob.glob(self.inst.child('', 'lteue-*')))
+
         # setting capabilities will later disable use of LD_LIBRARY_PATH from ELF loader -> modify RPATH instead.
         self.log('Setting RPATH for lteue')
-        util.change_elf_rpath(binary, util.prepend_library_path(self.inst), self.run_dir.new_dir('patchelf'))
-        # We also need to patch the arch-optimized binaries that lteue() will exec() into:
-        util.change_elf_rpath(self.inst.child('', 'lteue-*'), util.prepend_library_path(self.inst), self.run_dir.new_dir('patchelf2'))
+        # patchelf >= 0.10 is required to support passing several files at once:
+        util.change_elf_rpath(binaries, util.prepend_library_path(self.inst), self.run_dir.new_dir('patchelf'))
 
         # lteue requires CAP_NET_ADMIN to create tunnel devices: ioctl(TUNSETIFF):
         self.log('Applying CAP_NET_ADMIN capability to lteue')
-        util.setcap_net_admin(binary, self.run_dir.new_dir('setcap_net_admin'))
-        util.setcap_net_admin(self.inst.child('', 'lteue-*'), self.run_dir.new_dir('setcap_net_admin2'))
+        util.setcap_net_admin(binaries, self.run_dir.new_dir('setcap_net_admin'))
 
         args = (binary, os.path.abspath(self.config_file))
         self.dbg(run_dir=self.run_dir, binary=binary, env=env)
@@ -203,31 +212,21 @@ class AmarisoftUE(MS):
             f.write(r)
 
     def configure(self):
-        self.inst = util.Dir(os.path.abspath(self.bin_prefix()))
+        if self.inst is None:
+            self.inst = util.Dir(os.path.abspath(self.bin_prefix()))
         if not self.inst.isfile('', AmarisoftUE.BINFILE):
             raise log.Error('No %s binary in' % AmarisoftUE.BINFILE, self.inst)
 
         self.config_file = self.run_dir.child(AmarisoftUE.CFGFILE)
         self.config_rf_file = self.run_dir.child(AmarisoftUE.CFGFILE_RF)
         self.log_file = self.run_dir.child(AmarisoftUE.LOGFILE)
-        self.ifup_file = self.run_dir.new_file(AmarisoftUE.IFUPFILE)
-        os.chmod(self.ifup_file, 0o744) # add execution permission
-        with open(self.ifup_file, 'w') as f:
-            r = '''#!/bin/sh
-            set -x -e
-            ue_id="$1"           # UE ID
-            pdn_id="$2"          # PDN unique id (start from 0)
-            ifname="$3"          # Interface name
-            ipv4_addr="$4"       # IPv4 address
-            ipv4_dns="$5"        # IPv4 DNS
-            ipv6_local_addr="$6" # IPv6 local address
-            ipv6_dns="$7"        # IPv6 DNS
-            old_link_local=""
-            # script + sudoers file available in osmo-gsm-tester.git/utils/{bin,sudoers.d}
-            sudo /usr/local/bin/osmo-gsm-tester_netns_setup.sh "%s" "$ifname" "$ipv4_addr"
-            echo "${ue_id}: netns %s configured"
-            ''' % (self.netns(), self.netns())
-            f.write(r)
+        self.ifup_file = self.run_dir.new_child(AmarisoftUE.IFUPFILE)
+        # create it already with execution permission. The open() mode is
+        # subject to umask and ignored for existing files, so set it explicitly:
+        fd = os.open(self.ifup_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o744)
+        os.fchmod(fd, 0o744)
+        with os.fdopen(fd, 'w') as f:
+            f.write(IFUP_TEMPLATE % (self.netns(), self.netns()))
 
         if not self._run_node.is_local():
             self.rem_host = remote.RemoteHost(self.run_dir, self._run_node.ssh_user(), self._run_node.ssh_addr())
@@ -257,46 +256,48 @@ class AmarisoftUE(MS):
         # Convert to Python bool and overlay config
         config.overlay(values, dict(ue={'use_custom_band255': util.str2bool(values['ue'].get('use_custom_band255', 'false'))}))
 
+        rf_dev_type = self._conf.get('rf_dev_type')
         # We need to set some specific variables programatically here to match IP addresses:
-        if self._conf.get('rf_dev_type') == 'zmq':
+        if rf_dev_type == 'zmq':
+            num_ports = self.enb.num_ports()
             base_srate = num_prb2base_srate(self.enb.num_prb())
-            rf_dev_args = self.enb.get_zmq_rf_dev_args_for_ue(self)
+            rf_dev_args = [self.enb.get_zmq_rf_dev_args_for_ue(self)]
 
             # Single carrier
-            if self.enb.num_ports() == 1:
+            if num_ports == 1:
                 # SISO
-                rf_dev_args += ',rx_freq0=2630e6,tx_freq0=2510e6'
-            elif self.enb.num_ports() == 2:
+                rf_dev_args.append('rx_freq0=2630e6,tx_freq0=2510e6')
+            elif num_ports == 2:
                 # MIMO
-                rf_dev_args += ',rx_freq0=2630e6,rx_freq1=2630e6,tx_freq0=2510e6,tx_freq1=2510e6'
+                rf_dev_args.append('rx_freq0=2630e6,rx_freq1=2630e6,tx_freq0=2510e6,tx_freq1=2510e6')
 
-            rf_dev_args += ',id=ue,base_srate='+ str(base_srate)
+            rf_dev_args.append('id=ue,base_srate=' + str(base_srate))
             config.overlay(values, dict(ue=dict(sample_rate = base_srate / (1000*1000),
-                                                rf_dev_args = rf_dev_args)))
-
-        # The UHD rf driver seems to require the bandwidth configuration
-        if self._conf.get('rf_dev_type') == 'uhd':
-            bandwidth = num_prb2bandwidth(self.enb.num_prb())
-            config.overlay(values, dict(ue=dict(bandwidth = bandwidth)))
-
-        # Set UHD frame size as a function of the cell bandwidth on B2XX
-        if self._conf.get('rf_dev_type') == 'uhd' and values['ue'].get('rf_dev_args', None) is not None:
-            if 'b200' in values['ue'].get('rf_dev_args'):
-                rf_dev_args = values['ue'].get('rf_dev_args', '')
-                rf_dev_args += ',' if rf_dev_args != '' and not rf_dev_args.endswith(',') else ''
-
-                if self.enb.num_prb() < 25:
-                    rf_dev_args += 'send_frame_size=512,recv_frame_size=512'
-                elif self.enb.num_prb() == 25:
-                    rf_dev_args += 'send_frame_size=1024,recv_frame_size=1024'
-                elif self.enb.num_prb() > 50:
-                    rf_dev_args += 'num_recv_frames=64,num_send_frames=64'
+                                                rf_dev_args = ','.join(rf_dev_args))))
+        elif rf_dev_type == 'uhd':
+            num_prb = self.enb.num_prb()
+            rf_dev_args_cur = values['ue'].get('rf_dev_args', None)
+            # The UHD rf driver seems to require the bandwidth configuration
+            ue_values = dict(bandwidth=num_prb2bandwidth(num_prb))
+
+            # Set UHD frame size as a function of the cell bandwidth on B2XX
+            if rf_dev_args_cur is not None and 'b200' in rf_dev_args_cur:
+                rf_dev_args = [rf_dev_args_cur.rstrip(',')]
+
+                if num_prb < 25:
+                    rf_dev_args.append('send_frame_size=512,recv_frame_size=512')
+                elif num_prb == 25:
+                    rf_dev_args.append('send_frame_size=1024,recv_frame_size=1024')
+                elif num_prb > 50:
+                    rf_dev_args.append('num_recv_frames=64,num_send_frames=64')
 
                 # For 15 and 20 MHz, further reduce over the wire format to sc12
-                if self.enb.num_prb() >= 75:
-                    rf_dev_args += ',otw_format=sc12'
+                if num_prb >= 75:
+                    rf_dev_args.append('otw_format=sc12')
+
+                ue_values['rf_dev_args'] = ','.join([arg for arg in rf_dev_args if arg])
 
-                config.overlay(values, dict(ue=dict(rf_dev_args=rf_dev_args)))
+            config.overlay(values, dict(ue=ue_values))
 
         # rf driver is shared between amarisoft enb and ue, so it has a
         # different cfg namespace 'trx'. Copy needed values over there:
@@ -311,12 +312,11 @@ class AmarisoftUE(MS):
         self.gen_conf_file(self.config_rf_file, AmarisoftUE.CFGFILE_RF, values)
 
         if not self._run_node.is_local():
-            self.rem_host.recreate_remote_dir(self.remote_inst)
-            self.rem_host.scp('scp-inst-to-remote', str(self.inst), remote_prefix_dir)
+            self.rem_host.sync_inst_dir(self.inst, remote_prefix_dir)
             self.rem_host.recreate_remote_dir(remote_run_dir)
-            self.rem_host.scp('scp-cfg-to-remote', self.config_file, self.remote_config_file)
-            self.rem_host.scp('scp-cfg-rf-to-remote', self.config_rf_file, self.remote_config_rf_file)
-            self.rem_host.scp('scp-ifup-to-remote', self.ifup_file, self.remote_ifup_file)
+            self.rem_host.scp_bundle('scp-cfg-to-remote', self.run_dir,
+                                     (AmarisoftUE.CFGFILE, AmarisoftUE.CFGFILE_RF, AmarisoftUE.IFUPFILE),
+                                     remote_run_dir)
 
     def is_registered(self, mcc_mnc=None):
         # lteue doesn't call the ifup script until after it becomes attached, so
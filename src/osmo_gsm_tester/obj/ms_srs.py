@@ -20,6 +20,7 @@
 import os
 import pprint
 import re
+import functools
 
 from ..core import log, util, config, template, process, remote
 from ..core import schema
@@ -27,6 +28,25 @@ from .run_node import RunNode
 from .ms import MS
 from .srslte_common import srslte_common
 
+IPV4_RE = re.compile(r'[0-9]+(?:\.[0-9]+){3}')
+
+# characters dropped from metrics CSV column names, as numpy.genfromtxt() does
+CSV_NAME_DROP_RE = re.compile(r'[^\w ]')
+
+# rx/tx frequencies passed to the zmq rf driver, by (num_carriers, num_ports)
+ZMQ_FREQ_ARGS = {
+    # Single carrier SISO
+    (1, 1): 'rx_freq0=2630e6,tx_freq0=2510e6',
+    # Single carrier MIMO
+    (1, 2): 'rx_freq0=2630e6,rx_freq1=2630e6,tx_freq0=2510e6,tx_freq1=2510e6',
+    # 2x CA SISO
+    (2, 1): 'rx_freq0=2630e6,rx_freq1=2650e6,tx_freq0=2510e6,tx_freq1=2530e6',
+    # 2x CA MIMO
+    (2, 2): 'rx_freq0=2630e6,rx_freq1=2630e6,rx_freq2=2650e6,rx_freq3=2650e6,tx_freq0=2510e6,tx_freq1=2510e6,tx_freq2=2530e6,tx_freq3=2530e6',
+    # 4x CA SISO
+    (4, 1): 'rx_freq0=2630e6,rx_freq1=2650e6,rx_freq2=2670e6,rx_freq3=2680e6,tx_freq0=2510e6,tx_freq1=2530e6,tx_freq2=2550e6,tx_freq3=2560e6',
+    }
+
 def rf_type_valid(rf_type_str):
     return rf_type_str in ('zmq', 'uhd', 'soapy', 'bladerf')
 
@@ -47,6 +67,7 @@ def on_register_schemas():
         'dl_freq': schema.STR,
         'ul_freq': schema.STR,
         'prerun_scripts[]': schema.STR,
+        'prerun_parallel': schema.BOOL_STR,
         }
     for key, val in RunNode.schema().items():
         resource_schema['run_node.%s' % key] = val
@@ -85,6 +106,7 @@ class srsUE(MS, srslte_common):
     PCAPFILE = 'srsue.pcap'
     LOGFILE = 'srsue.log'
     METRICSFILE = 'srsue_metrics.csv'
+    PREPARED_MARKER = '.srsue' + util.MARKER_SUFFIX
 
     def __init__(self, testenv, conf):
         self._run_node = RunNode.from_conf(conf.get('run_node', {}))
@@ -97,7 +119,15 @@ class srsUE(MS, srslte_common):
         self.pcap_file = None
         self.metrics_file = None
         self.have_metrics_file = False
+        self._metrics = None
+        self._metrics_mtime = None
         self.process = None
+        self._rrc_stdout_path = None
+        self._rrc_stdout_mark = 0
+        self._rrc_connected = False
+        self._addr_stdout_path = None
+        self._addr_stdout_mark = 0
+        self._assigned_ipv4 = None
         self.rem_host = None
         self.remote_inst = None
         self.remote_run_dir = None
@@ -126,16 +156,10 @@ class srsUE(MS, srslte_common):
         self.sleep_after_stop()
 
         # copy back files (may not exist, for instance if there was an early error of process):
-        self.scp_back_metrics(raiseException=False)
-        try:
-            self.rem_host.scpfrom('scp-back-log', self.remote_log_file, self.log_file)
-        except Exception as e:
-            self.log(repr(e))
+        files = [srsUE.LOGFILE]
         if self.enable_pcap:
-            try:
-                self.rem_host.scpfrom('scp-back-pcap', self.remote_pcap_file, self.pcap_file)
-            except Exception as e:
-                self.log(repr(e))
+            files.append(srsUE.PCAPFILE)
+        self._stop_and_collect(files, raiseException=False)
 
         # Collect KPIs for each TC
         self.testenv.test().set_kpis(self.get_kpi_tree())
@@ -145,26 +169,35 @@ class srsUE(MS, srslte_common):
 
     def scp_back_metrics(self, raiseException=True):
         ''' Copy back metrics only if they have not been copied back yet '''
+        if self.have_metrics_file:
+            self.dbg('Metrics have already been copied back')
+            return
+        self._stop_and_collect((), raiseException)
+
+    def _stop_and_collect(self, names, raiseException=True):
+        '''Copy back files "names" from the remote run dir in one go, plus the
+           metrics file if it has not been copied back yet.'''
+        names = list(names)
         if not self.have_metrics_file:
             # file is not properly flushed until the process has stopped.
             if self.running():
                 self.stop()
-
-            # only SCP back if not running locally
-            if not self._run_node.is_local():
-                try:
-                    self.rem_host.scpfrom('scp-back-metrics', self.remote_metrics_file, self.metrics_file)
-                except Exception as e:
-                    if raiseException:
-                        self.err('Failed copying back metrics file from remote host')
-                        raise e
-                    else:
-                        # only log error
-                        self.log(repr(e))
-            # make sure to only call it once
+            names.append(srsUE.METRICSFILE)
+            # make sure to only copy it once
             self.have_metrics_file = True
-        else:
-            self.dbg('Metrics have already been copied back')
+
+        # only SCP back if not running locally
+        if self._run_node.is_local() or not names:
+            return
+        try:
+            self.rem_host.scpfrom_bundle('scp-back-files', self.remote_run_dir, names, self.run_dir)
+        except Exception as e:
+            if raiseException:
+                self.err('Failed copying back files from remote host')
+                raise e
+            else:
+                # only log error
+                self.log(repr(e))
 
     def netns(self):
         return "srsue1"
@@ -172,50 +205,13 @@ class srsUE(MS, srslte_common):
     def zmq_base_bind_port(self):
         return self._zmq_base_bind_port
 
-    def run_task(self, task):
-        # Get the arguments.
-        args_index = task.find('args=')
-
-        args = ()
-        # No arguments, all the string is the script.
-        if args_index == -1:
-            index = task.rfind('/')
-            task_name = task [index + 1:]
-            run_dir = util.Dir(self.run_dir.new_dir(task_name))
-            args = (task,)
-            self.log(f'task name is: {task_name}')
-            self.log(f'Running the script: {task} in the run dir: {run_dir}')
-        else:
-            ntask = task[:args_index - 1]
-            index = ntask.rfind('/')
-            task_name = ntask [index + 1:]
-            run_dir = util.Dir(self.run_dir.new_dir(task_name))
-            args = (ntask,)
-            args += tuple(task[args_index + 5:].split(','))
-            self.log(f'task name is: {task_name}')
-            self.log(f'Running the script: {task} in the run dir: {run_dir} with args: {args}')
-
-        proc = process.Process(task_name, run_dir, args)
-        # Set the timeout to a high value 20 minutes.
-        proc.set_default_wait_timeout(1200)
-        returncode = proc.launch_sync()
-        if returncode != 0:
-            raise log.Error('Error executing the pre run scripts. Aborting')
-            return False
-
-        return True
-
     # Runs all the tasks that are intended to run before the execution of the MS.
     def prerun_tasks(self):
         prerun_tasklist = self._conf.get('prerun_scripts', None)
         if not prerun_tasklist:
             return True
 
-        for task in prerun_tasklist:
-            if not self.run_task(task):
-                return False
-
-        return True
+        return self.run_tasks(prerun_tasklist, util.str2bool(self._conf.get('prerun_parallel', 'false')))
 
     def connect(self, enb):
         self.log('Starting srsue')
@@ -239,14 +235,15 @@ class srsUE(MS, srslte_common):
         remote_lib = self.remote_inst.child('lib')
         remote_binary = self.remote_inst.child('bin', srsUE.BINFILE)
         # setting capabilities will later disable use of LD_LIBRARY_PATH from ELF loader -> modify RPATH instead.
-        self.log('Setting RPATH for srsue')
         # srsue binary needs patchelf >= 0.9+52 to avoid failing during patch. OS#4389, patchelf-GH#192.
-        self.rem_host.change_elf_rpath(remote_binary, remote_lib)
-
         # srsue requires CAP_SYS_ADMIN to jump to net network namespace: netns(CLONE_NEWNET):
         # srsue requires CAP_NET_ADMIN to create tunnel devices: ioctl(TUNSETIFF):
-        self.log('Applying CAP_SYS_ADMIN+CAP_NET_ADMIN capability to srsue')
-        self.rem_host.setcap_netsys_admin(remote_binary)
+        # Both only need to be done once per uploaded inst dir, which is
+        # recreated whenever it changes:
+        self.log('Setting RPATH and applying CAP_SYS_ADMIN+CAP_NET_ADMIN capability to srsue')
+        self.rem_host.run_remote_sync_once('prepare-srsue', self.remote_inst.child('bin', srsUE.PREPARED_MARKER), remote_lib,
+                                           self.rem_host.change_elf_rpath_args(remote_binary, remote_lib),
+                                           self.rem_host.setcap_netsys_admin_args(remote_binary))
 
         self.log('Creating netns %s' % self.netns())
         self.rem_host.create_netns(self.netns())
@@ -263,14 +260,21 @@ class srsUE(MS, srslte_common):
         lib = self.inst.child('lib')
         env = {}
 
-        # setting capabilities will later disable use of LD_LIBRARY_PATH from ELF loader -> modify RPATH instead.
-        self.log('Setting RPATH for srsue')
-        util.change_elf_rpath(binary, util.prepend_library_path(lib), self.run_dir.new_dir('patchelf'))
+        rpath = util.prepend_library_path(lib)
+        # Skip patching if it was already done for this same binary and rpath:
+        marker = self.inst.child('bin', srsUE.PREPARED_MARKER)
+        if util.marker_matches(marker, util.file_state(binary, rpath)):
+            self.dbg('srsue binary already prepared, skipping patchelf and setcap')
+        else:
+            # setting capabilities will later disable use of LD_LIBRARY_PATH from ELF loader -> modify RPATH instead.
+            self.log('Setting RPATH for srsue')
+            util.change_elf_rpath(binary, rpath, self.run_dir.new_dir('patchelf'))
 
-        # srsue requires CAP_SYS_ADMIN to jump to net network namespace: netns(CLONE_NEWNET):
-        # srsue requires CAP_NET_ADMIN to create tunnel devices: ioctl(TUNSETIFF):
-        self.log('Applying CAP_SYS_ADMIN+CAP_NET_ADMIN capability to srsue')
-        util.setcap_netsys_admin(binary, self.run_dir.new_dir('setcap_netsys_admin'))
+            # srsue requires CAP_SYS_ADMIN to jump to net network namespace: netns(CLONE_NEWNET):
+            # srsue requires CAP_NET_ADMIN to create tunnel devices: ioctl(TUNSETIFF):
+            self.log('Applying CAP_SYS_ADMIN+CAP_NET_ADMIN capability to srsue')
+            util.setcap_netsys_admin(binary, self.run_dir.new_dir('setcap_netsys_admin'))
+            util.write_marker(marker, util.file_state(binary, rpath))
 
         self.log('Creating netns %s' % self.netns())
         util.create_netns(self.netns(), self.run_dir.new_dir('create_netns'))
@@ -338,33 +342,17 @@ class srsUE(MS, srslte_common):
             # Define all 8 possible RF ports (2x CA with 2x2 MIMO)
             rf_dev_args = self.enb.get_zmq_rf_dev_args_for_ue(self)
 
-            if self.num_carriers == 1:
-                # Single carrier
-                if self.enb.num_ports() == 1 and self.num_nr_carriers == 0:
-                    # SISO
-                    rf_dev_args += ',rx_freq0=2630e6,tx_freq0=2510e6'
-                elif self.enb.num_ports() == 2:
-                    # MIMO
-                    rf_dev_args += ',rx_freq0=2630e6,rx_freq1=2630e6,tx_freq0=2510e6,tx_freq1=2510e6'
-            elif self.num_carriers == 2:
-                # 2x CA
-                if self.enb.num_ports() == 1:
-                    # SISO
-                    rf_dev_args += ',rx_freq0=2630e6,rx_freq1=2650e6,tx_freq0=2510e6,tx_freq1=2530e6'
-                elif self.enb.num_ports() == 2:
-                    # MIMO
-                    rf_dev_args += ',rx_freq0=2630e6,rx_freq1=2630e6,rx_freq2=2650e6,rx_freq3=2650e6,tx_freq0=2510e6,tx_freq1=2510e6,tx_freq2=2530e6,tx_freq3=2530e6'
-            elif self.num_carriers == 4:
-                # 4x CA
-                if self.enb.num_ports() == 1:
-                    # SISO
-                    rf_dev_args += ',rx_freq0=2630e6,rx_freq1=2650e6,rx_freq2=2670e6,rx_freq3=2680e6,tx_freq0=2510e6,tx_freq1=2530e6,tx_freq2=2550e6,tx_freq3=2560e6'
-                elif self.enb.num_ports() == 2:
-                    # MIMO
-                    raise log.Error("4 carriers with MIMO isn't supported")
-            else:
-                # flag
-                raise log.Error('No rx/tx frequencies given for {} carriers' % self.num_carriers)
+            num_ports = self.enb.num_ports()
+            if self.num_carriers not in (1, 2, 4):
+                raise log.Error('No rx/tx frequencies given for %d carriers' % self.num_carriers)
+            if self.num_carriers == 4 and num_ports == 2:
+                raise log.Error("4 carriers with MIMO isn't supported")
+            freq_args = ZMQ_FREQ_ARGS.get((self.num_carriers, num_ports))
+            if self.num_carriers == 1 and num_ports == 1 and self.num_nr_carriers > 0:
+                # Single carrier SISO frequencies are not set when NR carriers are used
+                freq_args = None
+            if freq_args:
+                rf_dev_args += ',' + freq_args
 
             rf_dev_args += ',id=ue,base_srate='+ str(base_srate)
             config.overlay(values, dict(ue=dict(rf_dev_args=rf_dev_args)))
@@ -396,21 +384,29 @@ class srsUE(MS, srslte_common):
         self.dbg('SRSUE CONFIG:\n' + pprint.pformat(values))
 
         with open(self.config_file, 'w') as f:
-            r = template.render(srsUE.CFGFILE, values)
-            self.dbg(r)
-            f.write(r)
+            template.render_to_file(srsUE.CFGFILE, values, f)
+        self.dbg('Rendered', config_file=self.config_file)
 
         if not self._run_node.is_local():
-            self.rem_host.recreate_remote_dir(self.remote_inst)
-            self.rem_host.scp('scp-inst-to-remote', str(self.inst), remote_prefix_dir)
+            self.rem_host.sync_inst_dir(self.inst, remote_prefix_dir)
             self.rem_host.recreate_remote_dir(self.remote_run_dir)
             self.rem_host.scp('scp-cfg-to-remote', self.config_file, self.remote_config_file)
 
     def is_rrc_connected(self):
         ''' Check whether UE is RRC connected using console message '''
-        pos_connected = (self.process.get_stdout() or '').rfind('RRC Connected')
-        pos_released = (self.process.get_stdout() or '').rfind('RRC IDLE')
-        return pos_connected > pos_released
+        # Only look at the output appended since the last call, the last
+        # message seen so far tells the current state:
+        stdout_path = self.process.get_output_file('stdout')
+        if stdout_path != self._rrc_stdout_path:
+            self._rrc_stdout_path = stdout_path
+            self._rrc_stdout_mark = 0
+            self._rrc_connected = False
+        out, self._rrc_stdout_mark = self.process.read_output_since('stdout', self._rrc_stdout_mark)
+        pos_connected = out.rfind('RRC Connected')
+        pos_released = out.rfind('RRC IDLE')
+        if pos_connected != pos_released:
+            self._rrc_connected = pos_connected > pos_released
+        return self._rrc_connected
 
     def is_registered(self, mcc_mnc=None):
         ''' Checks if UE is EMM registered '''
@@ -420,12 +416,23 @@ class srsUE(MS, srslte_common):
         if ipv6:
             raise log.Error('IPv6 not implemented!')
         else:
-            stdout_lines = (self.process.get_stdout() or '').splitlines()
-            for line in reversed(stdout_lines):
-                if line.find('Network attach successful. IP: ') != -1:
-                    ipv4_addr = re.findall( r'[0-9]+(?:\.[0-9]+){3}', line)
-                    return ipv4_addr[0]
-            return None
+            # Only look at the output appended since the last call, keeping
+            # the last address found so far:
+            stdout_path = self.process.get_output_file('stdout')
+            if stdout_path != self._addr_stdout_path:
+                self._addr_stdout_path = stdout_path
+                self._addr_stdout_mark = 0
+                self._assigned_ipv4 = None
+            out, self._addr_stdout_mark = self.process.read_output_since('stdout', self._addr_stdout_mark)
+            # out may end with an unterminated line once the process exited:
+            pos = out.rfind('Network attach successful. IP: ')
+            if pos != -1:
+                end = out.find('\n', pos)
+                end = len(out) if end == -1 else end
+                m = IPV4_RE.search(out, pos, end)
+                if m is not None:
+                    self._assigned_ipv4 = m.group(0)
+            return self._assigned_ipv4
 
     def running(self):
         return not self.process.terminated()
@@ -466,10 +473,25 @@ class srsUE(MS, srslte_common):
     def verify_metric(self, value, operation='avg', metric='dl_brate', criterion='gt', window=1):
         # copy back metrics if we have not already done so
         self.scp_back_metrics(self)
-        metrics = srsUEMetrics(self.metrics_file)
-        return metrics.verify(value, operation, metric, criterion, window)
+        return self.get_metrics().verify(value, operation, metric, criterion, window)
 
-numpy = None
+    def get_metrics(self):
+        '''Return parsed metrics file, reusing the previously parsed one as long
+           as the file is not modified in between.'''
+        try:
+            mtime = os.stat(self.metrics_file).st_mtime_ns
+        except OSError:
+            mtime = None # let srsUEMetrics report the error
+        if self._metrics is None or mtime is None or mtime != self._metrics_mtime:
+            self._metrics = srsUEMetrics(self.metrics_file)
+            self._metrics_mtime = mtime
+        return self._metrics
+
+@functools.lru_cache(maxsize=1)
+def numpy_module():
+    '''numpy is only needed (and hence imported) once metrics are verified'''
+    import numpy
+    return numpy
 
 class srsUEMetrics(log.Origin):
 
@@ -483,46 +505,73 @@ class srsUEMetrics(log.Origin):
         super().__init__(log.C_RUN, 'srsue_metrics')
         self.raw_data = None
         self.metrics_file = metrics_file
-        global numpy
-        if numpy is None:
-            import numpy as numpy_module
-            numpy = numpy_module
-        # read CSV, guessing data type with first row being the legend
         try:
-            self.raw_data = numpy.genfromtxt(self.metrics_file, names=True, delimiter=';', dtype=None)
+            self.raw_data = self.read_csv(self.metrics_file)
         except (ValueError, IndexError, IOError) as error:
             self.err("Error parsing metrics CSV file %s" % self.metrics_file)
             raise error
+        # column views by name, to skip the structured array field lookup
+        self._cols = {name: self.raw_data[name] for name in self.raw_data.dtype.names}
+
+    @staticmethod
+    def read_csv(metrics_file):
+        '''Read CSV with first row being the legend. All metrics are expected
+           to be numeric, so parse them with loadtxt() straight into floats ("cc"
+           is used as index, hence int). Fall back to genfromtxt() guessing the
+           data types if some column doesn't fit. Both loaders get the same
+           column names, turned into identifiers like genfromtxt() would.'''
+        numpy = numpy_module()
+        with open(metrics_file) as f:
+            names = [CSV_NAME_DROP_RE.sub('', name.strip()).replace(' ', '_')
+                     for name in f.readline().split(';')]
+        dtype = [(name, numpy.int64 if name == 'cc' else numpy.float64) for name in names]
+        try:
+            return numpy.loadtxt(metrics_file, delimiter=';', skiprows=1, dtype=dtype, ndmin=1)
+        except ValueError:
+            return numpy.genfromtxt(metrics_file, names=names, skip_header=1, delimiter=';', dtype=None)
+
+    @staticmethod
+    def rolling_avg(data, window):
+        '''Average of each window consecutive items, same as convolve() with a
+           flat window in "valid" mode but O(n) regardless of window size. A
+           window longer than data is clamped to the length of data.'''
+        numpy = numpy_module()
+        if len(data) == 0:
+            raise log.Error('No samples available to calculate rolling average')
+        window = min(window, len(data))
+        cumsum = numpy.cumsum(numpy.concatenate(([0.0], data)))
+        return (cumsum[window:] - cumsum[:-window]) / window
 
     def verify(self, value, operation='avg', metric_str='dl_brate', criterion='gt', window=1):
         if operation not in self.VALID_OPERATIONS:
             raise log.Error('Unknown operation %s not in %r' % (operation, self.VALID_OPERATIONS))
         if criterion not in self.VALID_CRITERION:
             raise log.Error('Unknown operation %s not in %r' % (operation, self.VALID_CRITERION))
+        numpy = numpy_module()
         # check if given metric exists in data
-        sel_data = numpy.array([])
+        sel_data = None
         metrics_list = metric_str.split('+') # allow addition operator for columns
         for metric in metrics_list:
             try:
-                vec = numpy.array(self.raw_data[metric])
-            except ValueError as err:
+                # a view, no copy. Never modify it in place, raw_data is reused
+                vec = self._cols[metric]
+            except KeyError as err:
                 print('metric %s not available' % metric)
                 raise err
-            if sel_data.size == 0:
+            if sel_data is None:
                 # Initialize with dimension of first metric vector
                 sel_data = vec
             else:
                 # Sum them up assuming same array dimension
-                sel_data += vec
+                sel_data = sel_data + vec
 
         # Sum up all component carriers for rate metrics
-        if metric_str.find('brate'):
+        if 'brate' in metric_str:
             # Determine number of component carriers
-            num_cc = numpy.amax(numpy.array(self.raw_data['cc'])) + 1 # account for zero index
-            tmp_values = sel_data
-            sel_data = numpy.array(tmp_values[::num_cc]) # first carrier, every num_cc'th item in list
-            for cc in range(1, num_cc):
-                sel_data += numpy.array(tmp_values[cc::num_cc]) # all other carriers, start at cc index
+            num_cc = numpy.amax(self._cols['cc']) + 1 # account for zero index
+            # one row per time slot with one column per carrier, sum up each row:
+            num_rows = len(sel_data) // num_cc
+            sel_data = sel_data[:num_rows * num_cc].reshape(num_rows, num_cc).sum(axis=1)
 
         if operation == 'avg':
             result = numpy.average(sel_data)
@@ -530,12 +579,12 @@ class srsUEMetrics(log.Origin):
             result = numpy.sum(sel_data)
         elif operation == 'max_rolling_avg':
             # calculate rolling average over window and take maximum value
-            result = numpy.amax(numpy.convolve(sel_data, numpy.ones((window,))/window, mode='valid'))
+            result = numpy.amax(self.rolling_avg(sel_data, window))
         elif operation == 'min_rolling_avg':
             # trim leading zeros to avoid false negative when UE attach takes longer
             sel_data = numpy.trim_zeros(sel_data, 'f')
             # calculate rolling average over window and take minimum value
-            result = numpy.amin(numpy.convolve(sel_data, numpy.ones((window,))/window, mode='valid'))
+            result = numpy.amin(self.rolling_avg(sel_data, window))
 
         self.dbg(result=result, value=value)
 
@@ -546,7 +595,7 @@ class srsUEMetrics(log.Origin):
             success = True
 
         # Convert bitrate in Mbit/s:
-        if metric_str.find('brate') > 0:
+        if 'brate' in metric_str:
             result /= 1e6
             value /= 1e6
             mbit_str = ' Mbit/s'
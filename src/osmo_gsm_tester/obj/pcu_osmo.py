@@ -79,8 +79,7 @@ class OsmoPcu(pcu.Pcu):
         self.dbg('OSMO-PCU CONFIG:\n' + pprint.pformat(values))
 
         with open(self.config_file, 'w') as f:
-            r = template.render(OsmoPcu.PCU_OSMO_CFG, values)
-            self.dbg(r)
-            f.write(r)
+            template.render_to_file(OsmoPcu.PCU_OSMO_CFG, values, f)
+        self.dbg('Rendered', config_file=self.config_file)
 
 # vim: expandtab tabstop=4 shiftwidth=4
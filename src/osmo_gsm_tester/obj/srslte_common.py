@@ -17,9 +17,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from ..core import log
+import re
+
+from ..core import log, util, process
 from ..core.event_loop import MainLoop
 
+TASK_RE = re.compile(r'(?P<path>.+?)(?:\s+args=(?P<args>.*))?')
+
 class srslte_common(): # don't inherit from log.Origin here but instead use .name() from whoever inherits from us
 
     def __init__(self):
@@ -43,6 +47,72 @@ class srslte_common(): # don't inherit from log.Origin here but instead use .nam
         self.testenv.stop_process(self.process)
         self.sleep_after_stop()
 
+    def task_process(self, task):
+        # Task format: "/path/to/script[ args=arg1,arg2,...]"
+        m = TASK_RE.fullmatch(task)
+        task_path = m.group('path')
+        task_name = task_path.rsplit('/', 1)[-1]
+        run_dir = util.Dir(self.run_dir.new_dir(task_name))
+        args = (task_path,)
+        if m.group('args') is not None:
+            args += tuple(m.group('args').split(','))
+        self.log(f'task name is: {task_name}')
+        self.log(f'Running the script: {task} in the run dir: {run_dir} with args: {args}')
+
+        proc = process.Process(task_name, run_dir, args)
+        # Set the timeout to a high value 20 minutes.
+        proc.set_default_wait_timeout(1200)
+        return proc
+
+    def run_task(self, task):
+        proc = self.task_process(task)
+        returncode = proc.launch_sync()
+        if returncode != 0:
+            raise log.Error('Error executing the pre run scripts. Aborting')
+            return False
+
+        return True
+
+    def run_tasks(self, tasklist, parallel=False):
+        if not parallel:
+            for task in tasklist:
+                if not self.run_task(task):
+                    return False
+            return True
+
+        # Launch all tasks at once and wait for all of them to finish:
+        return self.wait_tasks(self.launch_tasks(tasklist))
+
+    def launch_tasks(self, tasklist):
+        procs = []
+        try:
+            for task in tasklist:
+                proc = self.task_process(task)
+                procs.append(proc)
+                # stopped by testenv if the test ends before wait_tasks()
+                self.testenv.remember_to_stop(proc, may_exit=True)
+                proc.launch()
+        except Exception as e:
+            self.stop_tasks(procs)
+            raise e
+        return procs
+
+    def stop_tasks(self, procs):
+        for proc in procs:
+            self.testenv.stop_process(proc)
+
+    def wait_tasks(self, procs):
+        if not procs:
+            return True
+        try:
+            MainLoop.wait(lambda: all([proc.terminated() for proc in procs]), timeout=1200)
+        finally:
+            self.stop_tasks(procs)
+        for proc in procs:
+            if proc.result != 0:
+                raise log.Error('Error executing the pre run scripts. Aborting')
+        return True
+
     def get_kpis(self):
         ''' Merge all KPI and return as flat dict '''
         self.extract_kpis()
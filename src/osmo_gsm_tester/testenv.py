@@ -67,26 +67,28 @@ class TestEnv(log_module.Origin):
     def suite(self):
         return self.suite_run
 
-    def remember_to_stop(self, process, respawn=False):
+    def remember_to_stop(self, process, respawn=False, may_exit=False):
         '''Ask suite to monitor and manage lifecycle of the Process object. If a
         process managed by suite finishes before cleanup time, the current test
         will be marked as FAIL and end immediatelly. If respwan=True, then suite
-        will respawn() the process instead.'''
-        self._processes.insert(0, (process, respawn))
+        will respawn() the process instead. If may_exit=True, the process is
+        expected to finish on its own and is only stopped at cleanup time if
+        still running.'''
+        self._processes.insert(0, (process, respawn, may_exit))
 
     def stop_processes(self):
         if len(self._processes) == 0:
             return
         strategy = process_module.ParallelTerminationStrategy()
         while self._processes:
-            proc, _ = self._processes.pop()
+            proc, _, _ = self._processes.pop()
             strategy.add_process(proc)
         strategy.terminate_all()
 
     def stop_process(self, process):
         'Remove process from monitored list and stop it'
         for proc_respawn in self._processes:
-            proc, respawn = proc_respawn
+            proc, _, _ = proc_respawn
             if proc == process:
                 self._processes.remove(proc_respawn)
                 proc.terminate()
@@ -131,11 +133,11 @@ class TestEnv(log_module.Origin):
         raise log_module.Error('Test Timeout triggered: %d seconds elapsed' % self._test.elapsed_time())
 
     def poll(self):
-        for proc, respawn in self._processes:
+        for proc, respawn, may_exit in self._processes:
             if proc.terminated():
                 if respawn == True:
                     proc.respawn()
-                else:
+                elif not may_exit:
                     proc.log_stdout_tail()
                     proc.log_stderr_tail()
                     log_module.ctx(proc)
@@ -42,7 +42,7 @@ enb.ue_add(ue_li[0])
 enb.start(epc)
 
 print('waiting for ENB to connect to EPC...')
-wait(epc.enb_is_connected, enb)
+epc.wait_enb_connected(enb)
 print('ENB is connected to EPC')
 
 for n in range(0, nof_ue):
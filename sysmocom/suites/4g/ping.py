@@ -16,7 +16,7 @@ enb.ue_add(ue)
 enb.start(epc)
 
 print('waiting for ENB to connect to EPC...')
-wait(epc.enb_is_connected, enb)
+epc.wait_enb_connected(enb)
 print('ENB is connected to EPC')
 
 ue.connect(enb)
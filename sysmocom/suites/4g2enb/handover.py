@@ -40,8 +40,8 @@ enbA.start(epc)
 enbB.start(epc)
 
 print('waiting for ENB to connect to EPC...')
-wait(epc.enb_is_connected, enbA)
-wait(epc.enb_is_connected, enbB)
+epc.wait_enb_connected(enbA)
+epc.wait_enb_connected(enbB)
 print('ENB is connected to EPC')
 
 ue.connect(enbA)
@@ -14,8 +14,8 @@ enbA.start(epc)
 enbB.start(epc)
 
 print('waiting for ENBs to connect to EPC...')
-wait(epc.enb_is_connected, enbA)
-wait(epc.enb_is_connected, enbB)
+epc.wait_enb_connected(enbA)
+epc.wait_enb_connected(enbB)
 print('ENBs is connected to EPC')
 
 ue.connect(enbA)
@@ -64,8 +64,7 @@ print('Waiting for bts to be ready...')
 wait(bts.ready_for_pcu)
 pcu.start()
 
-hlr.subscriber_add(ms_mo)
-hlr.subscriber_add(ms_mt)
+hlr.subscribers_add((ms_mo, ms_mt))
 
 ms_mo.connect(msc.mcc_mnc())
 ms_mt.connect(msc.mcc_mnc())
@@ -75,15 +74,13 @@ ms_mt.attach()
 ms_mo.log_info()
 ms_mt.log_info()
 
+# Both modems register and attach independently, wait for them together:
 print('waiting for modems to attach...')
-wait(ms_mo.is_registered, msc.mcc_mnc())
-wait(ms_mt.is_registered, msc.mcc_mnc())
-wait(msc.subscriber_attached, ms_mo)
-wait(msc.subscriber_attached, ms_mt)
+wait(lambda: ms_mo.is_registered(msc.mcc_mnc()) and ms_mt.is_registered(msc.mcc_mnc()))
+wait(msc.subscriber_attached, ms_mo, ms_mt)
 
 print('waiting for modems to attach to data services...')
-wait(ms_mo.is_attached)
-wait(ms_mt.is_attached)
+wait(lambda: ms_mo.is_attached() and ms_mt.is_attached())
 
 print('1: activate_pdp')
 activate_pdp(ms_mo, ms_mt)
@@ -27,8 +27,7 @@ bsc.start()
 bts.start()
 wait(bsc.bts_is_connected, bts)
 
-hlr.subscriber_add(ms_mo)
-hlr.subscriber_add(ms_mt)
+hlr.subscribers_add((ms_mo, ms_mt))
 
 ms_mo.connect(msc.mcc_mnc())
 ms_mt.connect(msc.mcc_mnc())
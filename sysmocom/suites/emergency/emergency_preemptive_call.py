@@ -40,10 +40,7 @@ bsc.start()
 bts.start()
 wait(bsc.bts_is_connected, bts)
 
-hlr.subscriber_add(ms_mo)
-hlr.subscriber_add(ms_mt)
-hlr.subscriber_add(ms_mo_emerg)
-hlr.subscriber_add(ms_mt_emerg)
+hlr.subscribers_add((ms_mo, ms_mt, ms_mo_emerg, ms_mt_emerg))
 
 ms_mo.connect(msc.mcc_mnc())
 ms_mt.connect(msc.mcc_mnc())
@@ -27,9 +27,9 @@ def ready_cb_place_voicecall(ms_li):
     wait(ms_mt.call_is_active, mt_cid)
     print('answer success, call established and ongoing')
 
-    sleep(5) # maintain the call active for 5 seconds
-
-    assert ms_mo.call_is_active(mo_cid) and ms_mt.call_is_active(mt_cid)
+    # maintain the call active for 5 seconds, bailing out as soon as it drops:
+    call_dropped = lambda: not (ms_mo.call_is_active(mo_cid) and ms_mt.call_is_active(mt_cid))
+    assert not wait_no_raise(call_dropped, [], {}, timeout=5, timestep=1)
     ms_mt.call_hangup(mt_cid)
     wait(lambda: len(ms_mo.call_id_list()) == 0 and len(ms_mt.call_id_list()) == 0)
     print('hangup success')
@@ -83,14 +83,14 @@ def setup_run_iperf3_test_parallel(num_ms, ready_cb=None):
         ms.attach()
         ms.log_info()
 
+    # All modems register and attach independently, wait for them together:
     print('waiting for modems to attach...')
-    for ms in ms_li:
-        wait(ms.is_registered, msc.mcc_mnc())
+    wait(lambda: all(ms.is_registered(msc.mcc_mnc()) for ms in ms_li))
     wait(msc.subscriber_attached, *ms_li)
 
     print('waiting for modems to attach to data services...')
+    wait(lambda: all(ms.is_attached() for ms in ms_li))
     for ms in ms_li:
-        wait(ms.is_attached)
         # We need to use inet46 since ofono qmi only uses ipv4v6 eua (OS#2713)
         ctx_id_v4 = ms.activate_context(apn='inet46', protocol=ms.CTX_PROT_IPv4)
         print("Setting up data plan for %r" % repr(ctx_id_v4))